@@ -0,0 +1,4 @@
+"""Benchmarks of compare_reports.py on synthetic GPMC reports.
+
+benchmarks.generate writes the reports and benchmarks.bench times them.
+"""
@@ -0,0 +1,166 @@
+""" Compare_GPOs Benchmarks
+
+Generates a bin folder of synthetic reports with benchmarks.generate and
+compares it with compare_reports.py once per parser with profiling on. The
+time spent reading and parsing reports, building trees, comparing them and
+rendering the output reports is printed and appended to a results file with
+the commit it ran on, so a change that makes a phase slower shows up against
+the previous run with the same options.
+
+Example:
+    Run from the Compare_GPOs folder, best of 3 runs of 10 reports.
+
+        C:\\Compare_GPOs> python -m benchmarks.bench --reports 10 --repeat 3
+"""
+
+__author__ = "Bryan Greener"
+__license__ = "See readme in repo root for license info."
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from pathlib import Path
+
+from .generate import generate, add_arguments
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+import compare_reports # pylint: disable=wrong-import-position
+
+# Phases of compare_reports metrics added up for each benchmark phase.
+PHASES = {'parse': ('read', 'parse'),
+          'build': ('build', 'index'),
+          'compare': ('compare',),
+          'render': ('copy', 'markup', 'write', 'flush')}
+# Default file results are appended to, one JSON object per line.
+RESULTS = Path(__file__).resolve().parent / 'results.jsonl'
+
+def run_once(bin_f, parser='bs4', workers=1):
+    """Compare every pair of reports in bin_f and return the seconds spent in
+    each of PHASES and in total."""
+    bin_f = os.path.abspath(bin_f)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as out_f:
+        # Outputs are written to out_f + "\\" + name so run in the output
+        # folder to keep them in it on any OS.
+        os.chdir(out_f)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                compare_reports.main_app(bin_f, '.', workers=workers,
+                                         parser=parser, profile=0)
+            with open(compare_reports.PROFILE, 'r') as file:
+                metrics = json.load(file)
+        finally:
+            os.chdir(cwd)
+    seconds = {x: sum(metrics['phases'].get(z, {}).get('seconds', 0)
+                      for z in y) for x, y in PHASES.items()}
+    seconds['total'] = metrics['seconds']
+    return seconds
+
+def git_commit():
+    """Returns the short hash of the checked out commit or None."""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                cwd=str(Path(__file__).resolve().parent),
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.decode().strip() or None
+
+def load_results(path):
+    """Returns every result in the results file at path."""
+    results = []
+    try:
+        with open(path, 'r') as file:
+            for line in file:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    continue
+    except IOError:
+        pass
+    return results
+
+def save_result(path, result):
+    """Append a result to the results file at path."""
+    try:
+        with open(path, 'a') as file:
+            file.write(json.dumps(result, sort_keys=True) + '\n')
+    except IOError:
+        print('Output file error for {}.'.format(path))
+
+def print_result(result, previous=None):
+    """Print the seconds of a result and the change from previous."""
+    seconds = result['seconds']
+    line = '{:<6}'.format(result['options']['parser'])
+    for phase in list(PHASES) + ['total']:
+        line += ' {:>8.3f}'.format(seconds[phase])
+        if previous and previous['seconds'].get(phase):
+            line += ' {:>+6.1%}'.format(
+                seconds[phase] / previous['seconds'][phase] - 1)
+        elif previous:
+            line += ' {:>7}'.format('')
+    if previous:
+        line += '  vs {} {}'.format(previous.get('commit'),
+                                    previous.get('date'))
+    print(line)
+
+def main(argv=None):
+    """Parses command line arguments, runs the benchmarks and records them."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark compare_reports.py on synthetic reports.')
+    parser.add_argument('--reports', type=int, default=8,
+                        help='Number of reports to compare.')
+    add_arguments(parser)
+    parser.add_argument('--parser', nargs='+', default=list(
+        compare_reports.PARSERS), choices=compare_reports.PARSERS,
+                        help='Parsers to benchmark.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes used to compare reports.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per parser. The fastest time of each '
+                        'phase is kept.')
+    parser.add_argument('--results', default=str(RESULTS),
+                        help='File results are appended to.')
+    parser.add_argument('--no-save', action='store_true',
+                        help='Only print results.')
+    args = parser.parse_args(argv)
+
+    options = {'reports': args.reports, 'seed': args.seed,
+               'overlap': args.overlap, 'sections': args.sections,
+               'leaves': args.leaves, 'rows': args.rows,
+               'nested': args.nested, 'workers': args.workers}
+    history = load_results(args.results)
+    header = '{:<6}'.format('')
+    for phase in list(PHASES) + ['total']:
+        header += ' {:>8}'.format(phase) + (' ' * 7 if history else '')
+    print(header)
+    with tempfile.TemporaryDirectory() as bin_f:
+        generate(bin_f, args.reports, args.seed, args.overlap, args.sections,
+                 args.leaves, args.rows, args.nested)
+        for name in args.parser:
+            runs = [run_once(bin_f, name, args.workers)
+                    for _ in range(max(args.repeat, 1))]
+            result = {
+                'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'bs4': compare_reports.bs4.__version__,
+                'lxml': compare_reports.etree.__version__,
+                'options': dict(options, parser=name),
+                'seconds': {x: min(y[x] for y in runs) for x in runs[0]}}
+            previous = next((x for x in reversed(history)
+                             if x.get('options') == result['options']), None)
+            print_result(result, previous)
+            if not args.no_save:
+                save_result(args.results, result)
+
+if __name__ == '__main__':
+    main()
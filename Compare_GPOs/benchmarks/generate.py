@@ -0,0 +1,245 @@
+""" Synthetic GPO Report Generator
+
+Writes GPMC style html GPO reports with the same structure as reports saved
+from GPMC or Get-GPOReport (sections, leaves, info tables with and without
+titles and comment columns, and nested subtables) but made up settings, so
+compare_reports.py can be benchmarked without sharing real domain reports.
+
+Example:
+    Write 20 reports with 4 sections of 6 leaves each to C:\\gpos
+
+        C:\\> python -m benchmarks.generate C:\\gpos 20 --sections 4 --leaves 6
+"""
+
+__author__ = "Bryan Greener"
+__license__ = "See readme in repo root for license info."
+
+import os
+import random
+import argparse
+from pathlib import Path
+
+HEAD = '''<html dir="ltr" xmlns:v="urn:schemas-microsoft-com:vml" \
+gpmc_reportInitialized="false">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-16" />
+<title>{name}</title>
+<style type="text/css">
+  body {{ background-color:#FFFFFF; font-size:68%; font-family:MS Shell Dlg; }}
+  table {{ font-size:100%; table-layout:fixed; width:100%; }}
+  td,th {{ overflow:visible; text-align:left; vertical-align:top; }}
+</style>
+<script language="javascript"><!--
+function getExplainWindowTitle() {{ return document.title; }}
+//--></script>
+</head>
+<body>
+<table class="title" cellpadding="0" cellspacing="0">
+<tr><td colspan="2" class="gponame">{name}</td></tr>
+<tr><td id="dtstamp">Data collected on: 8/9/2018 10:00:00 AM</td>\
+<td><div id="objshowhide" tabindex="0"></div></td></tr>
+</table>
+<div class="filler"></div>
+<div class="gposummary">
+<div class="he0_expanded"><span class="sectionTitle" tabindex="0">General\
+</span><a class="expando" href="#"></a></div>
+<div class="container"><div class="he1_expanded"><span class="sectionTitle" \
+tabindex="0">Details</span><a class="expando" href="#"></a></div>
+<div class="container"><table class="info">
+<tr><td scope="row">Domain</td><td>contoso.com</td></tr>
+<tr><td scope="row">Owner</td><td>CONTOSO\\Domain Admins</td></tr>
+<tr><td scope="row">GUID</td><td>{{{guid}}}</td></tr>
+</table>
+</div>
+<div class="he1_expanded"><span class="sectionTitle" tabindex="0">Links</span>\
+<a class="expando" href="#"></a></div>
+<div class="container"><table class="info3">
+<tr><th scope="col">Location</th><th scope="col">Enforced</th></tr>
+<tr><td>contoso.com</td><td>No</td></tr>
+</table>
+</div>
+</div>
+</div>
+'''
+
+TAIL = '''</body>
+</html>
+'''
+
+class Generator(object):
+    """Generator object class used to write one synthetic report. Settings
+    are kept, and keep the same value as in every other report, with
+    probability overlap so reports from the same seed overlap by about that
+    much."""
+    # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-few-public-methods
+    def __init__(self, seed, overlap=0.85, sections=3, leaves=5, rows=8,
+                 nested=2):
+        self.rand = random.Random(seed)
+        self.overlap = overlap
+        self.sections = sections # Sections per configuration category
+        self.leaves = leaves # Leaves per section
+        self.rows = rows # Settings per table
+        self.nested = nested # Options per nested subtable
+
+    def keep(self):
+        """Returns True if a setting or section shared by reports is kept."""
+        return self.rand.random() < self.overlap
+
+    def value(self, key):
+        """Returns the value of setting key."""
+        if self.keep():
+            return 'Value of {}'.format(key)
+        return 'Value {}'.format(self.rand.randint(0, 3))
+
+    def table(self, tags, prefix, rows, comment=False, nested=0, name=None):
+        """Returns the HTML of a settings table with a subtable after every
+        third row if nested is set."""
+        # pylint: disable=too-many-arguments
+        head = '<tr><th scope="col">Policy</th><th scope="col">Setting</th>'
+        head += '<th scope="col">Comment</th></tr>\n' if comment else '</tr>\n'
+        out = []
+        for row in range(rows):
+            if not self.keep() and self.rand.random() < 0.5:
+                continue
+            key = '{} setting {}'.format(prefix, row)
+            style = ' style="font-weight:bold"' if row % 17 == 16 else ''
+            cells = '<td{}><span class="v2">{}</span></td><td>{}</td>'.format(
+                style, key, self.value(key))
+            if comment:
+                cells += '<td>{}</td>'.format(
+                    'note' if self.rand.random() < 0.2 else '')
+            out.append('<tr>{}</tr>\n'.format(cells))
+            if nested and row % 3 == 0:
+                options = ''.join(
+                    '<tr><td>{} opt {}</td><td>{}</td></tr>\n'.format(
+                        key, x, self.value(key + str(x)))
+                    for x in range(nested)
+                    if self.keep() or self.rand.random() < 0.5)
+                out.append('<tr><td colspan="{}"><table class="subtable">\n'
+                           '<tr><th scope="col">Option</th><th scope="col">'
+                           'Value</th></tr>\n{}</table></td></tr>\n'.format(
+                               3 if comment else 2, options))
+        if self.rand.random() < 0.3:
+            out.append('<tr><td><span class="v2">{} extra {}</span></td>'
+                       '<td>x</td>{}</tr>\n'.format(
+                           prefix, self.rand.randint(0, 99),
+                           '<td></td>' if comment else ''))
+        return '{}<table class="{}" cellpadding="0" cellspacing="0">\n' \
+            '{}{}</table>\n'.format('<b>{}</b>'.format(name) if name else '',
+                                    tags, head, ''.join(out))
+
+    def leaf(self, prefix, idx):
+        """Returns the HTML of the tables of a leaf section. Leaves cycle
+        through the table layouts found in GPMC reports."""
+        kind = idx % 4
+        if kind == 0: # Titled tables in divs
+            return '<div>{}</div><div>{}{}</div>'.format(
+                self.table('info', prefix, self.rows, name='General'),
+                self.table('info2', prefix + ' b', self.rows // 2,
+                           name='Options'),
+                self.table('info3', prefix + ' c', self.rows // 3,
+                           comment=True, name='Properties'))
+        elif kind == 1: # Administrative template with comments and options
+            return '<div>{}</div>\n'.format(self.table(
+                'info3', prefix, self.rows, comment=True, nested=self.nested))
+        elif kind == 2: # Table directly in the container
+            return self.table('info', prefix, self.rows)
+        return '<div>\n{}</div>\n'.format(self.table(
+            'info', prefix, self.rows, nested=self.nested))
+
+    def config(self, name):
+        """Returns the HTML of a Computer or User Configuration section."""
+        body = ''
+        for idx, category in enumerate(['Policies', 'Preferences']):
+            if idx and not self.keep():
+                continue
+            groups = ''
+            for sec in range(self.sections):
+                if sec and not self.keep():
+                    continue
+                sec_name = '{} Section {}'.format(category, sec)
+                leaves = ''
+                for leaf in range(self.leaves):
+                    if leaf and not self.keep():
+                        continue
+                    leaf_name = '{} Leaf {}'.format(sec_name, leaf)
+                    if leaf % 5 == 4:
+                        # Leaves one level deeper
+                        items = section(4, leaf_name + ' Item',
+                                        self.leaf(leaf_name, leaf))
+                        items += section(4, leaf_name + ' Item 2',
+                                         self.leaf(leaf_name + '2', leaf + 1))
+                        leaves += section(3, leaf_name, items)
+                    else:
+                        leaves += section(3, leaf_name,
+                                          self.leaf(leaf_name, leaf))
+                groups += section(2, sec_name, leaves)
+            if self.rand.random() < 0.15:
+                # Section only some reports have
+                groups += section(2, 'Only Here {}'.format(
+                    self.rand.randint(0, 5)), section(
+                        3, 'Lonely', self.leaf('Lonely', 1)))
+            body += section('1h', category, groups)
+        return section(0, name, body)
+
+    def report(self, name):
+        """Returns the HTML of a report for GPO name."""
+        out = HEAD.format(name=name, guid=self.rand.randint(0, 10**8))
+        out += self.config('Computer Configuration (Enabled)')
+        if self.rand.random() < 0.8:
+            out += self.config('User Configuration (Enabled)')
+        else:
+            out += '<div class="he0"><span class="sectionTitle" ' \
+                'tabindex="0">User Configuration (Disabled)</span></div>\n'
+        return out + TAIL
+
+def section(level, title, inner):
+    """Returns the HTML of a section title and its container."""
+    return '<div class="he{}_expanded"><span class="sectionTitle" ' \
+        'tabindex="0">{}</span><a class="expando" href="#"></a></div>\n' \
+        '<div class="container">{}</div>\n'.format(level, title, inner)
+
+def generate(bin_f, count, seed=0, overlap=0.85, sections=3, leaves=5,
+             rows=8, nested=2, encoding='utf-16'):
+    """Write count reports named GPO 0.html, GPO 1.html... to bin_f. GMPC
+    saves reports as UTF-16. Returns the paths of the reports."""
+    # pylint: disable=too-many-arguments
+    Path(bin_f).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for idx in range(count):
+        gen = Generator(seed * 1000 + idx, overlap, sections, leaves, rows,
+                        nested)
+        paths.append(os.path.join(bin_f, 'GPO {}.html'.format(idx)))
+        with open(paths[-1], 'w', encoding=encoding) as file:
+            file.write(gen.report('GPO {}'.format(idx)))
+    return paths
+
+def add_arguments(parser):
+    """Add the options of the generator to an argument parser."""
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the reports. Same seed, same reports.')
+    parser.add_argument('--overlap', type=float, default=0.85,
+                        help='Share of settings reports have in common.')
+    parser.add_argument('--sections', type=int, default=3,
+                        help='Sections per configuration category.')
+    parser.add_argument('--leaves', type=int, default=5,
+                        help='Leaf sections per section.')
+    parser.add_argument('--rows', type=int, default=8,
+                        help='Settings per table.')
+    parser.add_argument('--nested', type=int, default=2,
+                        help='Options per nested subtable (0 for none).')
+
+def main(argv=None):
+    """Parses command line arguments and writes reports."""
+    parser = argparse.ArgumentParser(
+        description='Write synthetic GPMC html reports for benchmarks.')
+    parser.add_argument('bin_folder', help='Folder to write reports to.')
+    parser.add_argument('count', type=int, help='Number of reports.')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    generate(args.bin_folder, args.count, args.seed, args.overlap,
+             args.sections, args.leaves, args.rows, args.nested)
+
+if __name__ == '__main__':
+    main()
@@ -21,42 +21,588 @@ __status__ = "Production"
 
 import re
 import os
+import sys
+import copy
+import csv
+import json
+import io
+import gzip
+import mmap
+import codecs
+import tarfile
+import zipfile
+import pickle
+import hashlib
+import math
+import time
+import cProfile
+import random
+import itertools
+import collections
+import queue
+import argparse
+import contextlib
 import threading
-import urllib.error
-from urllib.request import urlopen
+import multiprocessing
+from html import unescape
 from pathlib import Path
-from tkinter import ttk
-from tkinter import *
-from tkinter.filedialog import askdirectory
+from concurrent.futures import ProcessPoolExecutor
+# The GUI is only imported when run without arguments so the command line
+# and worker processes never import tkinter.
+if __name__ == '__main__' and len(sys.argv) == 1:
+    from tkinter import ttk
+    from tkinter import *
+    from tkinter.filedialog import askdirectory, askopenfilename
+import bs4
 from bs4 import BeautifulSoup
+from bs4.element import Tag, NavigableString
+from bs4.formatter import HTMLFormatter
+from lxml import etree
+
+# Maximum number of reports per side of a block given to a worker process.
+BLOCK_SIZE = 32
+# Number of soups of reports kept by each process for the next pairs. The
+# rest are parsed again when needed as a soup takes several times the
+# memory of the tree of its report.
+SOUP_CACHE = 16
+# Soups kept by report hash, least recently used first.
+SOUPS = collections.OrderedDict()
+# Queue used by worker processes to report finished pairs.
+PROGRESS = None
+# Log file every process appends progress and errors to, or None to print
+# them to stdout.
+LOG = None
+# Metrics recorded when profiling or None.
+METRICS = None
+# Lock of the phases of METRICS, which reader and writer threads add to.
+PHASES_LOCK = threading.Lock()
+# Records being measured by the current thread. Phases timed by the reader
+# and writer threads are never added to the record of another pair.
+MEASURED = threading.local()
+# Name of the metrics file written to the out folder when profiling.
+PROFILE = 'profile.json'
+# Version of the parse cache. Cached trees from another version of this
+# program or of the parser are dropped as positions in the soup may differ.
+CACHE_VERSION = (4, bs4.__version__, etree.__version__)
+# Maximum size in bytes of the parse cache before old entries are evicted.
+CACHE_SIZE = 1024 * 1024 * 1024
+# Parsers that can be used to build trees. bs4 builds them from a
+# BeautifulSoup tree and lxml directly from the lxml HTML parser.
+PARSERS = ('bs4', 'lxml')
+# Formats comparisons can be written in. html writes marked up reports,
+# json writes a diff of every setting that html reports are rendered from
+# and jsonl streams a line for every difference of every pair to one file.
+FORMATS = ('html', 'json', 'jsonl')
+# Version of JSON diffs and status of settings in them by comparison.
+DIFF_VERSION = 1
+DIFF_STATUS = ('same', 'only1', 'only2', 'changed')
+# Size in bytes of the buffer output files are written through.
+OUTPUT_BUFFER = 1 << 16
+# True if the installed BeautifulSoup has the internals serialize_soup
+# writes pieces with (tested with 4.15). Other versions write whole outputs
+# with prettify().
+SERIALIZE_PIECES = (all(hasattr(Tag, x) for x
+                        in ('_format_tag', '_should_pretty_print',
+                            'self_and_descendants'))
+                    and hasattr(NavigableString, 'output_ready')
+                    and hasattr(HTMLFormatter.REGISTRY.get('minimal'),
+                                'indent'))
+# Byte order marks of the encodings reports are saved in. GPMC saves them
+# as UTF-16 LE with a BOM.
+BOMS = ((codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16-le'),
+        (codecs.BOM_UTF16_BE, 'utf-16-be'))
+# Size in bytes from which reports are mapped into memory instead of read.
+MMAP_SIZE = 1 << 20
+# Number of reports read ahead of parsing by the reader thread of a process.
+READ_AHEAD = 4
+# Number of outputs and finished pairs waiting for the writer thread of a
+# process, and per worker for the main process, before comparing waits for
+# it. Each output holds a marked up soup.
+WRITE_AHEAD = 4
+# Sinks outputs can be written to. files writes loose files, gzip compressed
+# files and zip and tar a single archive in the out folder.
+OUTPUTS = ('files', 'gzip', 'zip', 'tar')
+# Name of the archive written by archive sinks by sink.
+ARCHIVES = {'zip': 'comparisons.zip', 'tar': 'comparisons.tar.gz'}
+# Name of the file jsonl differences are streamed to.
+DIFFERENCES = 'differences.jsonl'
+# Name of the shared files the style and scripts in the head of reports are
+# moved to, by hash of their contents and type.
+SHARED_FILE = 'gpmc_{}.{}'
+# Name and version of the manifest of reports and outputs in the out folder.
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+# Options of the manifest that change outputs. Changing any of them compares
+# every pair again.
+OUTPUT_OPTIONS = ('combined', 'compact', 'format', 'output', 'shared_style')
+# Name of the journal of pairs finished by a run that hasn't completed.
+JOURNAL = 'journal.jsonl'
+# Style attributes removed from the paired tag of tables so they don't cause
+# mismatches.
+STYLE_ATTR = re.compile(r'style=\".*\"')
+# Title of the configuration sections every GPMC report has at least one
+# of, enabled or not.
+CONFIG_TITLE = re.compile(r'(Computer|User) Configuration \(')
+# Colors of the key in the general section of reports and their meaning.
+COLOR_KEY = (('#F1948A', 'Setting exists in GPO 1 but not in GPO 2.'),
+             ('#BB8FCE', 'Setting exists in GPO 2 but not in GPO 1.'),
+             ('#F7DC6F', 'Setting exists in both GPOs but has a different '
+              'value.'),
+             ('#82E0AA', 'Setting is the same in both GPOs.'))
+# Colors of the key of reports of one GPO against all other GPOs.
+AGGREGATE_KEY = (('#F1948A', 'Setting or section is only in this GPO.'),
+                 ('#F7DC6F', 'Setting is in other GPOs with a different '
+                  'value.'),
+                 ('#82E0AA', 'Setting is in other GPOs with the same value.'))
+# Name of the list of settings set in more than one report.
+REDUNDANCY = 'redundant_settings.csv'
+# Number of hash functions in MinHash signatures of reports.
+MINHASH_PERMUTATIONS = 128
+# Mersenne prime used as modulus of the MinHash hash functions.
+MINHASH_PRIME = (1 << 61) - 1
 
 class Tree(object):
-    """Tree object class used to create n-ary tree nodes."""
+    """Tree object class used to create n-ary tree nodes. Trees, tables and
+    cells use __slots__ and hold positions and strings only, never tags, so
+    hundreds of reports can be kept in memory at once."""
     # pylint: disable=too-many-instance-attributes
     # pylint: disable=too-few-public-methods
+    __slots__ = ('data', 'name', 'parent', 'is_leaf', 'children', 'table',
+                 'path', 'key', 'digest', 'div', 'container')
+
     def __init__(self):
-        self.data = None # Full HTML of container
+        self.data = None # Section title span. Only set while building tree
         self.name = None # String property of spans
-        self.inner_html = None # Full HTML of innermost divs for testing
         self.parent = None # Tree object for upward mobility in tree
         self.is_leaf = False
         self.children = [] # List of Tree objects
         self.table = [] # 2D list of table data
-        self.comparisons = [] # 2D list of table data comparisons
         self.path = None # List of all parent node names up to root of tree
+        self.key = None # Tuple of path used to index leaves
+        self.digest = None # Hash of HTML of all leaves below node
+        self.div = None # Position of section title div in soup
+        self.container = None # Position of section container div in soup
 
 class Table(object):
     """Table object class used to store table information."""
     # pylint: disable=too-few-public-methods
-    def __init__(self, html=None, tags=None, name=None):
-        self.html = html
-        self.tags = tags
-        self.name = name
+    __slots__ = ('pos', 'tags', 'name', 'table', 'paired_tag', 'index',
+                 'subtables')
+
+    def __init__(self, pos=None, tags=None, name=None):
+        self.pos = pos # Position of table in soup
+        self.tags = tags # Tuple of classes of table
+        self.name = name # HTML of bold title of table
         self.table = []
         self.paired_tag = None
+        self.index = {} # Map of first cell HTML to rows starting with it
+        self.subtables = {} # Map of paired tag to rows holding subtables
+
+class Cell(object):
+    """Cell object class used to store a table cell without its tag so that
+    trees can be cached. Cells are equal if their HTML is equal."""
+    # pylint: disable=too-few-public-methods
+    __slots__ = ('pos', 'name', 'html', 'style', 'strings')
+
+    def __init__(self, pos=None, name='td', html='', style=False,
+                 strings=()):
+        # Strings are interned as the same cells repeat across reports.
+        self.pos = pos # Position of cell in soup
+        self.name = sys.intern(name) # th or td
+        self.html = sys.intern(html) # HTML of cell compared instead of tag
+        self.style = style # True if cell has a style attribute
+        self.strings = tuple(sys.intern(x) for x in strings) # Strings in cell
+
+    def __getstate__(self):
+        return (self.pos, self.name, self.html, self.style, self.strings)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __eq__(self, other):
+        return isinstance(other, Cell) and self.html == other.html
+
+    def __ne__(self, other):
+        return not self == other
+
+class Trie(object):
+    """Trie object class used to index the sections leading to leaves of a
+    report by name from the top level down. Each node holds the position of
+    the container of the first section with its path, where sections missing
+    from the report are added."""
+    # pylint: disable=too-few-public-methods
+    __slots__ = ('children', 'container')
+
+    def __init__(self, container=None):
+        self.children = {} # Map of section name to Trie object
+        self.container = container # Position of section container div
+
+    def deepest(self, names):
+        """Returns the number of leading names that are a path in the trie
+        and the node at the end of that path."""
+        node, depth = self, 0
+        for name in names:
+            child = node.children.get(name)
+            if child is None:
+                break
+            node, depth = child, depth + 1
+        return depth, node
+
+class Report(object):
+    """Report object class used to hold the tree of a GPO report for a
+    batch. Its soup is only kept in SOUPS while it is in use."""
+    # pylint: disable=too-few-public-methods
+    def __init__(self, path):
+        self.path = path
+        self.url = "file:" + str(path)
+        self.sha1 = None # Hash of the report file
+        self.root = None # Tree object built from soup
+        self.leaf_list = [] # List of all leaf nodes in root
+        self.leaf_index = {} # Map of leaf key to leaves with that key
+        self.sections = set() # Keys of leaves without the top level name
+        self.names = set() # Every name in any leaf path
+        self.trie = Trie() # Trie of leaf paths from the top level down
+
+    def __getstate__(self):
+        # The path is set when the report is loaded from the cache.
+        state = self.__dict__.copy()
+        state['path'] = None
+        return state
+
+class CacheUnpickler(pickle.Unpickler):
+    """Unpickler for the parse cache. Only classes of the tree are loaded and
+    they are found in this module whatever name it had when the entry was
+    written (__main__ or __mp_main__ in worker processes)."""
+    # pylint: disable=too-few-public-methods
+    def find_class(self, module, name):
+        if name in ('Report', 'Tree', 'Trie', 'Table', 'Cell'):
+            return globals()[name]
+        raise pickle.UnpicklingError('{}.{} not allowed'.format(module, name))
+
+class Comparison(object):
+    """Comparison object class used to store the changes found between two
+    trees. These are applied to a copy of either soup afterwards so that
+    neither report is modified by a comparison and both directions of the
+    comparison come from the same changes."""
+    # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.changes = [] # List of (action, ...) tuples in order found
+        self.marked = set() # ids of first cells of rows already compared
+        self.matched = set() # ids of table2 rows matched to a table1 row
+
+class Aggregate(object):
+    """Aggregate object class used to collect the comparisons of one report
+    with every other report for its aggregate report."""
+    # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.count = 0 # Number of reports compared with
+        self.rows = {} # Map of first cell position to [cells, same, changed]
+        self.divs = {} # Map of section div position to reports without it
+
+    def add(self, name, rows, divs):
+        """Add the rows and section divs of the report found by comparing it
+        with report name."""
+        self.count += 1
+        for div in divs:
+            self.divs[div] = self.divs.get(div, 0) + 1
+        for cells, comparison in rows:
+            entry = self.rows.setdefault(cells[0], [cells, [], []])
+            if comparison == 0:
+                entry[1].append(name)
+            elif comparison == 3:
+                entry[2].append(name)
+
+class Metrics(object):
+    """Metrics object class used to record wall time per phase and the time
+    and size of every report and pair when profiling."""
+    # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.phases = {} # Map of phase to [calls, seconds]
+        self.reports = [] # Dict of times and counts per report loaded
+        self.pairs = [] # Dict of times per pair compared
+
+    def merge(self, other):
+        """Add the metrics of other (from a worker process) to these."""
+        for phase, (calls, seconds) in other.phases.items():
+            total = self.phases.setdefault(phase, [0, 0.0])
+            total[0] += calls
+            total[1] += seconds
+        self.reports += other.reports
+        self.pairs += other.pairs
+
+@contextlib.contextmanager
+def timed(phase):
+    """Context manager adding the wall time of its body to phase and to the
+    records measured by the current thread."""
+    if METRICS is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        with PHASES_LOCK:
+            total = METRICS.phases.setdefault(phase, [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+        for record in getattr(MEASURED, 'records', ()):
+            record[phase] = record.get(phase, 0) + seconds
+
+@contextlib.contextmanager
+def measure(kind, **record):
+    """Context manager adding record with the wall time of its body and of
+    every phase timed in it by the current thread to the reports or pairs
+    (kind) of METRICS. Yields the record so counts can be added to it, or
+    None when not profiling."""
+    if METRICS is None:
+        yield None
+        return
+    if not hasattr(MEASURED, 'records'):
+        MEASURED.records = []
+    MEASURED.records.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        MEASURED.records.remove(record)
+        getattr(METRICS, kind).append(record)
+
+def report_counts(report):
+    """Returns the number of leaves, tables, subtables, rows and cells in a
+    report."""
+    counts = {'leaves': len(report.leaf_list), 'tables': 0, 'subtables': 0,
+              'rows': 0, 'cells': 0}
+    tables = [x for y in report.leaf_list for x in y.table]
+    counts['tables'] = len(tables)
+    while tables:
+        table = tables.pop()
+        for row in table.table:
+            counts['rows'] += 1
+            for cell in row:
+                if isinstance(cell, Table):
+                    counts['subtables'] += 1
+                    tables.append(cell)
+                else:
+                    counts['cells'] += 1
+    return counts
+
+def read_report(path):
+    """Returns the SHA-1 of the bytes of the report at path and its text.
+    Reports of MMAP_SIZE bytes or more are mapped instead of read so they
+    are hashed and decoded without another copy."""
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size < MMAP_SIZE:
+            data = file.read()
+            return hashlib.sha1(data).hexdigest(), decode_report(data)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as data:
+                return hashlib.sha1(data).hexdigest(), decode_report(data)
+
+def decode_report(data):
+    """Returns the text of the bytes of a report. The encoding is taken from
+    the BOM, else UTF-16 if the first character has a zero byte, else UTF-8
+    if it decodes and Windows-1252 otherwise. The charset of the meta tag is
+    ignored as reports saved again by other tools keep the UTF-16 one."""
+    for bom, encoding in BOMS:
+        if data[:len(bom)] == bom:
+            return codecs.decode(data[len(bom):], encoding, 'replace')
+    head = bytes(data[:2])
+    if len(head) == 2 and head[0] and not head[1]:
+        return codecs.decode(data, 'utf-16-le', 'replace')
+    if len(head) == 2 and head[1] and not head[0]:
+        return codecs.decode(data, 'utf-16-be', 'replace')
+    try:
+        return codecs.decode(data, 'utf-8')
+    except UnicodeDecodeError:
+        return codecs.decode(data, 'cp1252', 'replace')
 
-def build_tree(soup, root, leaf_list):
-    """Initialize tree and call recursive build function."""
+def load_report(path, cache_f=None, parser='bs4', contents=None):
+    """Read and parse a report and build its tree with parser (one of
+    PARSERS). Returns None on error, so a report that can't be read or
+    built only leaves out the pairs it is in. If cache_f is set, the tree
+    is loaded from the cache folder when the same report was parsed before
+    with the same parser and is added to it otherwise. contents is the
+    result of read_report if the report was read ahead."""
+    with measure('reports', report=Path(path).name, parser=parser) as record:
+        try:
+            report = load_report_util(path, cache_f, parser, contents)
+        except Exception as ex: # pylint: disable=broad-except
+            print('Report error for {}: {!r}'.format(Path(path).name, ex))
+            return None
+        if record is not None and report:
+            record.update(report_counts(report))
+        return report
+
+def load_report_util(path, cache_f=None, parser='bs4', contents=None):
+    """Helper for load_report that reads and builds the report."""
+    report = Report(path)
+    try:
+        if contents is None:
+            with timed('read'):
+                contents = read_report(path)
+    except (IOError, ValueError) as ex:
+        print('IOError: ' + str(ex))
+        return None
+    sha1, text = contents
+    key = '{}.{}'.format(sha1, parser)
+    cached = None
+    if cache_f:
+        with timed('cache'):
+            cached = load_cache(cache_f, key)
+    if cached:
+        # The same report may have been cached under another file name.
+        cached.path, cached.url = report.path, report.url
+        cached.sha1 = key.split('.')[0]
+        cached.root.name = report.url
+        return cached
+    report.sha1 = key.split('.')[0]
+    report.root = Tree()
+    report.root.name = report.url
+    if parser == 'lxml':
+        with timed('parse'):
+            doc = parse_lxml(text)
+        if not is_report_lxml(doc):
+            print('Report error for {}: not a GPMC report.'.format(
+                report.path.name))
+            return None
+        with timed('build'):
+            build_tree_lxml(doc, report.root, report.leaf_list)
+    else:
+        with timed('parse'):
+            soup = BeautifulSoup(text, 'lxml')
+        if not is_report(soup):
+            print('Report error for {}: not a GPMC report.'.format(
+                report.path.name))
+            return None
+        with timed('build'):
+            # Tags are stored by position in soup so the tree holds no tags.
+            tags = soup.find_all(True)
+            positions = {id(x): i for i, x in enumerate(tags)}
+            with timed('pair_table'):
+                paired = pair_tables(tags)
+            build_tree(soup.find('body'), report.root, report.leaf_list,
+                       positions, paired)
+        # Kept for the first pairs of the report, which usually follow.
+        keep_soup(report.sha1, soup)
+    with timed('index'):
+        index_leaves(report)
+    if cache_f:
+        with timed('cache'):
+            save_cache(cache_f, key, report)
+    return report
+
+def is_report(soup):
+    """Returns True if soup has the body, summary and configuration sections
+    of a GPMC report, so a file that isn't one fails once when loaded
+    rather than in every pair it is in."""
+    body = soup.find('body')
+    return (body is not None
+            and body.find('div', class_='gposummary') is not None
+            and any(CONFIG_TITLE.match(x.get_text()) for x
+                    in body.find_all('span', class_='sectionTitle')))
+
+def report_soup(report, keep=True):
+    """Returns the soup of a report from SOUPS, parsing it again if it
+    isn't there. The soup is never modified while it is kept. If keep isn't
+    set the soup is taken out of SOUPS so it can be modified."""
+    soup = SOUPS.pop(report.sha1, None)
+    if soup is None:
+        with timed('read'):
+            _, text = read_report(report.path)
+        with timed('parse'):
+            soup = BeautifulSoup(text, 'lxml')
+    if keep:
+        keep_soup(report.sha1, soup)
+    return soup
+
+def keep_soup(sha1, soup):
+    """Keep the soup of the report with hash sha1 in SOUPS, dropping the
+    least recently used soups past SOUP_CACHE."""
+    SOUPS[sha1] = soup
+    while len(SOUPS) > SOUP_CACHE:
+        SOUPS.popitem(last=False)
+
+def load_cache(cache_f, key):
+    """Load a report from the cache. Returns None if it isn't cached. Entries
+    from another CACHE_VERSION or that can't be read are removed."""
+    path = os.path.join(cache_f, key + '.pickle')
+    try:
+        with open(path, 'rb') as file:
+            # The stamp goes through the allow-list too so nothing in an
+            # entry is unpickled without it.
+            if CacheUnpickler(file).load() != CACHE_VERSION:
+                raise ValueError('Stale cache entry ' + path)
+            report = CacheUnpickler(file).load()
+        # Mark as recently used so it is evicted last.
+        os.utime(path)
+        return report
+    except FileNotFoundError:
+        return None
+    except (IOError, EOFError, ValueError, TypeError, AttributeError,
+            ImportError, pickle.UnpicklingError):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+def save_cache(cache_f, key, report):
+    """Save a report to the cache. It is written to a temporary file first so
+    other processes never load a partial entry."""
+    path = os.path.join(cache_f, key + '.pickle')
+    temp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(cache_f, exist_ok=True)
+        with open(temp, 'wb') as file:
+            pickle.dump(CACHE_VERSION, file)
+            pickle.dump(report, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except (IOError, pickle.PicklingError, RecursionError) as ex:
+        print('Cache error: ' + str(ex))
+
+def evict_cache(cache_f, size=CACHE_SIZE):
+    """Remove the least recently used entries from the cache until it is no
+    larger than size."""
+    try:
+        entries = sorted((x.stat().st_mtime, x.stat().st_size, str(x)) for x
+                         in Path(cache_f).glob('*.pickle'))
+    except OSError:
+        return
+    total = sum(x[1] for x in entries)
+    for _, entry_size, entry in entries:
+        if total <= size:
+            break
+        try:
+            os.remove(entry)
+            total -= entry_size
+        except OSError:
+            pass
+
+def index_leaves(report):
+    """Index leaves of a report by their path so leaves can be matched to
+    leaves of other reports without searching every leaf."""
+    # Tree node of each trie node while building the trie
+    nodes = {id(report.trie): report.root}
+    for leaf in report.leaf_list:
+        report.leaf_index.setdefault(leaf.key, []).append(leaf)
+        report.sections.add(leaf.key[:-1])
+        report.names.update(leaf.key)
+        trie = report.trie
+        for name in reversed(leaf.key):
+            child = trie.children.get(name)
+            if child is None:
+                node = next(x for x in nodes[id(trie)].children
+                            if x.name == name)
+                child = trie.children[name] = Trie(node.container)
+                nodes[id(child)] = node
+            trie = child
+
+def build_tree(soup, root, leaf_list, positions, paired):
+    """Initialize tree and call recursive build function. positions maps
+    id(tag) to the position of every tag in soup and paired the position of
+    every table to its paired tag."""
     # Manually add these entries as they exist in every GPO report.
     # Possibility of these being set to Disabled however this won't affect
     # the integrity of the report as it will just be excluded.
@@ -66,32 +612,47 @@ def build_tree(soup, root, leaf_list):
     if c_config:
         c_node = Tree()
         c_node.data = c_config
-        c_node.name = c_config.string
+        c_node.name = str(c_config.string)
         c_node.parent = root
         root.children.append(c_node)
 
     if u_config:
         u_node = Tree()
         u_node.data = u_config
-        u_node.name = u_config.string
+        u_node.name = str(u_config.string)
         u_node.parent = root
         root.children.append(u_node)
 
-    build_tree_util(root, leaf_list)
+    build_tree_util(root, leaf_list, positions, paired)
+    root.digest = digest_tree(root)
     return root, leaf_list
 
-def build_tree_util(root, leaf_list):
+def digest_tree(node):
+    """Hash the names and digests of the children of a node, or the hash of
+    the HTML of a leaf node, so identical sections have the same digest."""
+    sha = hashlib.sha1()
+    if node.is_leaf:
+        sha.update(node.digest)
+    for child in node.children:
+        sha.update(str(child.name).encode('utf-8'))
+        sha.update(child.digest)
+    return sha.digest()
+
+def build_tree_util(root, leaf_list, positions, paired):
     """Recursively build tree."""
     for child in root.children:
         content = child.data.parent.find_next_sibling(
             'div', class_='container')
+        child.div = positions.get(id(child.data.find_parent('div')))
+        child.container = positions.get(id(content))
         siblings = content.next_element.find_next_siblings(
             'div', class_='container')
         # If at leaf node...
         if not siblings:
             child.is_leaf = True
-            # Remove all newline chars from inner_html to sanitize environment
-            child.inner_html = str(content).replace('\n', '')
+            # Remove all newline chars from HTML to sanitize environment
+            child.digest = hashlib.sha1(str(content).replace(
+                '\n', '').encode('utf-8')).digest()
             # Populate table of data at leaf node
             #tables = content.find_all('table')
             tables = [x for x
@@ -102,18 +663,20 @@ def build_tree_util(root, leaf_list):
             if not tables:
                 tables = content.find('table')
             if tables:
-                child.table = [Table(html=x,
-                                     tags=x['class'],
-                                     name=x.find_previous_sibling('b')) for y
-                               in tables for x in y
-                               if x and y
-                               and x != '\n' and y != '\n'
-                               and x.has_attr('class')]
-                for table in child.table:
+                for html in [x for y in tables for x in y
+                             if x and y
+                             and x != '\n' and y != '\n'
+                             and x.has_attr('class')]:
+                    name = html.find_previous_sibling('b')
+                    child.table.append(Table(
+                        pos=positions[id(html)],
+                        tags=tuple(html['class']),
+                        name=str(name) if name is not None else None))
                     # Create paired tag for comparisons util
-                    if isinstance(table.html.previous_element, str):
-                        table.paired_tag = table.html.previous_element
-                    table.table = build_tree_util_add_table(table)
+                    if isinstance(html.previous_element, str):
+                        child.table[-1].paired_tag = str(html.previous_element)
+                    child.table[-1].table = build_tree_util_add_table(
+                        child.table[-1], html, positions, paired)
                 # List of all leaf nodes to make comparison easier
                 leaf_list.append(child)
         else: #otherwise add child nodes
@@ -122,7 +685,10 @@ def build_tree_util(root, leaf_list):
                 child.children[-1].parent = child
                 child.children[-1].data = i.find_previous_sibling(
                     'div').find_next('span', class_='sectionTitle')
-                child.children[-1].name = child.children[-1].data.string
+                name = child.children[-1].data.string
+                if name is not None:
+                    name = str(name)
+                child.children[-1].name = name
         # Populate path to root for node (makes life easier later)
         temp = child
         temp_list = []
@@ -130,43 +696,294 @@ def build_tree_util(root, leaf_list):
             temp_list.append(temp.name)
             temp = temp.parent
         child.path = temp_list
-        build_tree_util(child, leaf_list)
+        child.key = tuple(temp_list)
+        child.data = None # Tags are not kept in the tree
+        build_tree_util(child, leaf_list, positions, paired)
+        child.digest = digest_tree(child)
 
-def build_tree_util_add_table(table):
-    """Helper for build_tree that adds tables to nodes."""
-    for row in table.html.find_all('tr', recursive=False):
+def build_tree_util_add_table(table, html, positions, paired):
+    """Helper for build_tree that adds rows of html to table."""
+    for row in html.find_all('tr', recursive=False):
         temp_row = []
         for head in row.find_all('th', recursive=False):
-            temp_row.append(head)
+            temp_row.append(build_cell(head, positions))
         for data in row.find_all('td', recursive=False):
-            if data.find('table'):
+            sub_html = data.find('table')
+            if sub_html:
+                # Create new Table object and add to row
+                temp_row.append(Table(pos=positions[id(sub_html)],
+                                      tags=tuple(sub_html['class'])))
+                # Get pair string for table and add to Table object
+                temp_row[-1].paired_tag = paired.get(temp_row[-1].pos)
+                # Recursive call to catch sub-tables
+                temp_row[-1].table = build_tree_util_add_table(
+                    temp_row[-1], sub_html, positions, paired)
+            else:
+                temp_row.append(build_cell(data, positions))
+        add_row(table, temp_row)
+    return table.table
+
+def build_cell(tag, positions):
+    """Helper for build_tree that creates a Cell from a th or td tag."""
+    return Cell(pos=positions[id(tag)], name=tag.name, html=str(tag),
+                style=tag.has_attr('style'),
+                strings=[str(x) for x in tag.contents if isinstance(x, str)])
+
+def add_row(table, row):
+    """Helper for build_tree that adds a row to a table and its index."""
+    table.table.append(row)
+    # Index row by its first cell so rows can be matched without a scan
+    if row and isinstance(row[0], Table):
+        table.subtables.setdefault(row[0].paired_tag, []).append(row)
+    elif row:
+        table.index.setdefault(row[0].html, []).append(row)
+
+def pair_tables(tags):
+    """Returns a map of the position of every table in tags, all tags of a
+    soup in document order, to the first cell of the closest row before it
+    that isn't a header and doesn't contain a table. The cell identifies
+    nested tables when comparing."""
+    paired = {}
+    data = ret = None
+    for pos, tag in enumerate(tags):
+        if tag.name == 'tr':
+            first = tag.find('td')
+            if first is not None and first.find('table') is None:
+                data, ret = first, None
+        elif tag.name == 'table' and data is not None:
+            if ret is None:
+                # Remove any style tags in ret to prevent incorrect
+                # mismatching. Done once for each row tables are paired to.
+                ret = STYLE_ATTR.sub('', str(data))
+            paired[pos] = ret
+    return paired
+
+# ===========
+# LXML PARSER
+# ===========
+# Same tree as build_tree built from the lxml HTML parser directly. Every
+# bs4 navigation call used by build_tree is replaced by the same lookup on
+# lxml elements. The report is parsed the same way bs4 parses it with lxml
+# so tags have the same positions as in the soup used to write output.
+
+def parse_lxml(text):
+    """Parse the text of a report with the lxml HTML parser the way bs4
+    does."""
+    parser = etree.HTMLParser(recover=True)
+    parser.feed(text)
+    return parser.close()
+
+def build_tree_lxml(doc, root, leaf_list):
+    """Build the tree of a report parsed by parse_lxml. The lxml tree is
+    dropped once the tree is built."""
+    positions = {x: i for i, x
+                 in enumerate(x for x in doc.iter() if isinstance(x.tag, str))}
+    nodes = list(positions)
+    with timed('pair_table'):
+        paired = pair_tables_lxml(nodes)
+    body = next(doc.iter('body'))
+    for text in ['Computer Configuration (Enabled)',
+                 'User Configuration (Enabled)']:
+        span = next((x for x in body.iter('span')
+                     if lxml_string(x) == text), None)
+        if span is not None:
+            root.children.append(Tree())
+            root.children[-1].data = span
+            root.children[-1].name = text
+            root.children[-1].parent = root
+    build_tree_lxml_util(root, leaf_list, positions, nodes, paired)
+    root.digest = digest_tree(root)
+    return root, leaf_list
+
+def build_tree_lxml_util(root, leaf_list, positions, nodes, paired):
+    """Recursively build tree. Same as build_tree_util."""
+    for child in root.children:
+        content = lxml_next_sibling(child.data.getparent(), 'div', 'container')
+        child.div = positions.get(next(child.data.iterancestors('div'), None))
+        child.container = positions.get(content)
+        siblings = [x for x in lxml_next_element_siblings(content)
+                    if x.tag == 'div' and lxml_has_class(x, 'container')]
+        # If at leaf node...
+        if not siblings:
+            child.is_leaf = True
+            # Remove all newline chars from HTML to sanitize environment
+            child.digest = hashlib.sha1(lxml_html(content).replace(
+                '\n', '').encode('utf-8')).digest()
+            # Populate table of data at leaf node
+            tables = [x for x in content if x.tag == 'table']
+            tables += [[x for x in y if x.tag == 'table'] for y
+                       in content if y.tag == 'div']
+            if not tables:
+                tables = next(content.iter('table'), None)
+            if tables is not None:
+                for html in [x for y in tables for x in y
+                             if isinstance(x.tag, str)
+                             and 'class' in x.attrib]:
+                    name = next(html.itersiblings('b', preceding=True), None)
+                    child.table.append(Table(
+                        pos=positions[html],
+                        tags=tuple(html.attrib['class'].split()),
+                        name=lxml_html(name) if name is not None else None))
+                    # Create paired tag for comparisons util
+                    child.table[-1].paired_tag = lxml_previous_string(html)
+                    child.table[-1].table = build_tree_lxml_add_table(
+                        child.table[-1], html, positions, paired)
+                # List of all leaf nodes to make comparison easier
+                leaf_list.append(child)
+        else: #otherwise add child nodes
+            for i in siblings:
+                child.children.append(Tree())
+                child.children[-1].parent = child
+                child.children[-1].data = lxml_find_next(
+                    next(i.itersiblings('div', preceding=True)),
+                    'span', 'sectionTitle', positions, nodes)
+                child.children[-1].name = lxml_string(
+                    child.children[-1].data)
+        # Populate path to root for node (makes life easier later)
+        temp = child
+        temp_list = []
+        while temp.parent:
+            temp_list.append(temp.name)
+            temp = temp.parent
+        child.path = temp_list
+        child.key = tuple(temp_list)
+        child.data = None # Elements are not kept in the tree
+        build_tree_lxml_util(child, leaf_list, positions, nodes, paired)
+        child.digest = digest_tree(child)
+
+def build_tree_lxml_add_table(table, html, positions, paired):
+    """Helper for build_tree_lxml that adds rows of html to table."""
+    for row in html.iterchildren('tr'):
+        temp_row = [build_cell_lxml(x, positions)
+                    for x in row.iterchildren('th')]
+        for data in row.iterchildren('td'):
+            sub_html = next(data.iter('table'), None)
+            if sub_html is not None:
                 # Create new Table object and add to row
-                temp_row.append(Table(html=data.find('table'),
-                                      tags=data.find('table')['class']))
+                temp_row.append(Table(pos=positions[sub_html],
+                                      tags=tuple(
+                                          sub_html.attrib['class'].split())))
                 # Get pair string for table and add to Table object
-                temp_row[-1].paired_tag = pair_table(temp_row[-1].html)
+                temp_row[-1].paired_tag = paired.get(temp_row[-1].pos)
                 # Recursive call to catch sub-tables
-                temp_row[-1].table = build_tree_util_add_table(temp_row[-1])
+                temp_row[-1].table = build_tree_lxml_add_table(
+                    temp_row[-1], sub_html, positions, paired)
             else:
-                temp_row.append(data)
-        table.table.append(temp_row)
+                temp_row.append(build_cell_lxml(data, positions))
+        add_row(table, temp_row)
     return table.table
 
-def pair_table(current_row):
-    """Function to find an identifier element to identify a table."""
-    # Find previous row that isnt a header and doesn't contain a table.
-    previous_row = [x for x in current_row.find_all_previous('tr')
-                    if x.find('td') and not x.find('td').find('table')][0]
-    ret = str(previous_row.find_all('td')[0])
-    # Remove any style tags in ret to prevent incorrect mismatching.
-    return re.sub(r'style=\".*\"', '', ret)
-
-def compare_trees(leaf_list1, leaf_list2, body):
-    """Function to compare two trees which uses util function."""
+def build_cell_lxml(element, positions):
+    """Helper for build_tree_lxml that creates a Cell from a th or td."""
+    strings = [element.text] if element.text else []
+    for child in element:
+        if not isinstance(child.tag, str) and child.text:
+            strings.append(child.text) # Comments are strings in bs4
+        if child.tail:
+            strings.append(child.tail)
+    return Cell(pos=positions[element], name=element.tag,
+                html=lxml_html(element), style='style' in element.attrib,
+                strings=strings)
+
+def pair_tables_lxml(nodes):
+    """Same as pair_tables for lxml elements in document order."""
+    paired = {}
+    data = ret = None
+    for pos, element in enumerate(nodes):
+        if element.tag == 'tr':
+            first = next(element.iter('td'), None)
+            if first is not None and next(first.iter('table'), None) is None:
+                data, ret = first, None
+        elif element.tag == 'table' and data is not None:
+            if ret is None:
+                # Remove any style tags to prevent incorrect mismatching.
+                ret = STYLE_ATTR.sub('', lxml_html(data))
+            paired[pos] = ret
+    return paired
+
+def lxml_html(element):
+    """Returns the HTML of an element without the text following it."""
+    return etree.tostring(element, encoding='unicode', method='html',
+                          with_tail=False)
+
+def lxml_has_class(element, name):
+    """Returns True if element has class name."""
+    return name in element.get('class', '').split()
+
+def lxml_string(element):
+    """Returns the string bs4 gives as .string for element or None."""
+    if len(element) == 0:
+        return element.text
+    elif len(element) == 1 and not element.text and not element[0].tail:
+        return lxml_string(element[0])
+    return None
+
+def is_report_lxml(doc):
+    """Same as is_report for a report parsed by parse_lxml."""
+    body = next(doc.iter('body'), None) if doc is not None else None
+    return (body is not None
+            and any('gposummary' in x.get('class', '').split()
+                    for x in body.iter('div'))
+            and any(CONFIG_TITLE.match(''.join(x.itertext())) for x
+                    in body.iter('span')
+                    if 'sectionTitle' in x.get('class', '').split()))
+
+def lxml_next_sibling(element, tag, name):
+    """Returns the first following sibling with tag and class name."""
+    return next((x for x in element.itersiblings(tag)
+                 if lxml_has_class(x, name)), None)
+
+def lxml_next_element_siblings(element):
+    """Returns the siblings following the bs4 next_element of element."""
+    if element.text:
+        return list(element)
+    elif len(element):
+        return list(element)[1:]
+    # Node following element is its tail or next sibling or that of a parent
+    while element is not None and not element.tail and \
+        element.getnext() is None:
+        element = element.getparent()
+    if element is None:
+        return []
+    elif element.tail:
+        return list(element.itersiblings())
+    return list(element.getnext().itersiblings())
+
+def lxml_previous_string(element):
+    """Returns the bs4 previous_element of element if it is a string."""
+    previous = element.getprevious()
+    if previous is None:
+        return element.getparent().text or None
+    # Otherwise it is the last node in the previous sibling or its tail
+    while not previous.tail and len(previous):
+        previous = previous[-1]
+    if previous.tail:
+        return previous.tail
+    # Text of the last element (or comment, which are strings in bs4)
+    return previous.text or None
+
+def lxml_find_next(element, tag, name, positions, nodes):
+    """Returns the first element after element with tag and class name."""
+    for idx in range(positions[element] + 1, len(nodes)):
+        if nodes[idx].tag == tag and lxml_has_class(nodes[idx], name):
+            return nodes[idx]
+    return None
+
+def compare_trees(report1, report2):
+    """Function to compare two trees which uses util function.
+    Neither tree is modified. The changes needed to mark up either report
+    are returned in a Comparison object for update_html_comparisons."""
+    comp = Comparison()
     # ([a1,a2,..,an],[b1,b2,...,bn]) same settings in both tables
-    temp_list = [x for x in [[y.table, z.table] for y
-                             in leaf_list1 for z
-                             in leaf_list2 if y.path == z.path]]
+    temp_list = []
+    for y in report1.leaf_list:
+        for z in report2.leaf_index.get(y.key, []):
+            if y.digest == z.digest:
+                # Identical sections are the same without comparing rows
+                for i, j in zip(y.table, z.table):
+                    record_same(i, j, comp)
+            else:
+                temp_list.append([y.table, z.table])
     # For each combination of like tables.
     for i, j in [c for d
                  in [[[a, b] for a in x for b in y
@@ -175,148 +992,244 @@ def compare_trees(leaf_list1, leaf_list2, body):
                       and a.paired_tag == b.paired_tag] for x, y
                      in temp_list] for c in d]:
         # i is table in table1 j is table in table2
-        compare_trees_util(i, j)
+        compare_trees_util(i, j, comp)
+    # Sections are not symmetric so are found for each direction.
+    if report1.root.digest != report2.root.digest:
+        compare_sections(report1, report2, comp, 0)
+        compare_sections(report2, report1, comp, 1)
+    return comp
+
+def record_same(i, j, comp):
+    """Record every row of table i as the same as the row of identical
+    table j in the same place."""
+    for row_i, row_j in zip(i.table, j.table):
+        if not row_i:
+            continue
+        elif isinstance(row_i[0], Table):
+            record_same(row_i[0], row_j[0], comp)
+        elif row_i[0].name == 'th':
+            continue
+        else:
+            record_comparison(0, row_i, comp, row_j=row_j)
+            comp.matched.add(id(row_j))
+
+def compare_sections(report1, report2, comp, side):
+    """Function to find sections unique to either tree for the report on
+    side (0 for GPO 1, 1 for GPO 2) of comp."""
     # Mark entire sections as unique to GPO 1
-    for i in [x for x in leaf_list1 if x.path[:-1] not
-              in [y.path[:-1] for y in leaf_list2]]:
-        i.data.find_parent('div')['style'] = 'background:#F1948A'
+    for i in [x for x in report1.leaf_list
+              if x.key[:-1] not in report2.sections]:
+        comp.changes.append(('style', side, i.div, 'background:#F1948A'))
+        # Mark parent sections with names not in GPO 2
+        node = i.parent
         for j in i.path[1:]:
-            if j not in [a for b
-                         in [[c for c in d.path] for d
-                             in leaf_list2] for a in b]:
-                div = i.data.find_all_previous(string=j)[0].find_parent('div')
-                div['style'] = 'background:#F1948A'
+            if j not in report2.names:
+                comp.changes.append(('style', side, node.div,
+                                     'background:#F1948A'))
+            node = node.parent
     # Add in sections unique to GPO 2
-    leaf_paths = [x.path[:-1] for x in leaf_list1]
-    for i in [x for x in leaf_list2 if x.path[:-1] not in leaf_paths]:
-        i.data.find_parent('div')['style'] = 'background:#BB8FCE'
-        all_paths = [list(reversed(x.path)) for x in leaf_list1]
-        match = [0, 0]
-        rev_path = list(reversed(i.path))
-        for p_idx, p_val in enumerate(all_paths):
-            idx = 0
-            while idx < len(p_val) and \
-                idx < len(rev_path) and \
-                p_val[idx] == rev_path[idx]:
-                if idx + 1 < len(rev_path):
-                    idx += 1
-                    if idx > match[0]:
-                        match[0] = idx
-                        match[1] = p_idx # unused. possibly useful in future
-                else:
-                    break
-        # incrementally find paths that exist up to the path that doesnt exist
-        # add to lowest path that exists
-        temp_el = body
-        tag, parent, container = None, None, None
-        # Walk through tree until at div that doesnt exist. (Spot to add)
-        for j in range(0, match[0]):
-            tag = temp_el.find(string=rev_path[j])
-            parent = tag.find_parent('div')
-            container = parent.find_next_sibling('div', class_='container')
-            temp_el = container
-        result = i.data.find_previous(string=rev_path[match[0]])
-        if result:
-            div_to_add = result.find_parent('div')
-        else:
-            div_to_add = i.data.find_parent('div')
-        div_to_add['style'] = 'background:#BB8FCE'
-        container_to_add = div_to_add.find_next_sibling('div',
-                                                        class_='container')
-        # Update all lower div styles since none are in tree
-        for j in container_to_add.find_all('span'):
-            j.find_parent('div')['style'] = 'background:#BB8FCE'
-        if container:
-            if div_to_add:
-                container.append(div_to_add)
-            if container_to_add:
-                container.append(container_to_add)
+    for i in [x for x in report2.leaf_list
+              if x.key[:-1] not in report1.sections]:
+        # Deepest section of GPO 1 on the path of i, leaving out the leaf
+        # itself. Sections are added to its container.
+        depth, trie = report1.trie.deepest(i.key[:0:-1])
+        container = trie.container
+        # Section to add is the ancestor of i at the first missing level.
+        node = i
+        for _ in range(len(i.key) - 1 - depth):
+            node = node.parent
+        div_to_add = node.div
+        if container is not None and div_to_add is not None:
+            comp.changes.append(('add', side, container, div_to_add))
 
-def compare_trees_util(i, j):
-    """Utility function that compares items in rows and updates style.
+def compare_trees_util(i, j, comp):
+    """Utility function that compares items in rows and records changes.
     Thought process here is to go row by row recursively through table1 and
-    compare row to every row in table2, deleting table2 row matches afterwards.
+    compare row to every row in table2, removing table2 row matches afterwards.
     Finally, go through all remaining rows in table2 and add to table1 with
-    color coding to show that this row doesn't exist in table1."""
+    color coding to show that this row doesn't exist in table1.
+    Rows in table2 are matched through its index and removed by adding
+    them to comp.matched so the same table can be reused for other
+    comparisons. Rows already marked by an earlier table comparison keep
+    their first result and never match again. Matched rows from both
+    tables are recorded so either table can be marked up."""
     # pylint: disable=too-many-branches
+    if not i.table:
+        # Nothing is added to an empty table but j is still marked up
+        record_mirror(j, comp)
+        return
     for row_i in i.table:
         if row_i[0].name == 'th':
-            if row_i in j.table:
+            if id(row_i[0]) not in comp.marked and \
+                row_i in [x for x in j.index.get(row_i[0].html, [])
+                          if id(x) not in comp.matched
+                          and id(x[0]) not in comp.marked]:
                 continue #same table structure, skip header
             else:
                 for row in i.table[1:]: #subtable only in table1
-                    comparison_handler(1, row)
+                    record_comparison(1, row, comp)
+                # Same for table2 when it is marked up against table1
+                record_mirror(j, comp)
                 return #not same table. skip
         # if table, recursive call
         elif isinstance(row_i[0], Table): #if row contains subtable
             if row_i[0].paired_tag:#compare paired tags in tables
-                row_j = [x for x
-                         in j.table if x[0].paired_tag == row_i[0].paired_tag]
+                row_j = j.subtables.get(row_i[0].paired_tag)
                 if row_j: #compare both subtables
-                    compare_trees_util(row_i[0], row_j[0][0])
+                    compare_trees_util(row_i[0], row_j[0][0], comp)
                 else:
-                    compare_trees_util(row_i[0], Table())
+                    compare_trees_util(row_i[0], Table(), comp)
             else: #recursive call with subtable compared to nothing
-                compare_trees_util(row_i[0], Table())
-        elif row_i[0] in [x for y in j.table for x in y]: #if row in table2
-            row_j = j.table[[x[0] for x in j.table].index(row_i[0])] #search
-            # Ignore comment column if exists.
-            if row_i == row_j or (row_i[:-1] == row_j[:-1] and \
-                                  (i.table[0][0].name == 'th' and \
-                                   'Comment' in i.table[0][-1])):
-                comparison_handler(0, row_i)
-            else: #same setting different values
-                comparison_handler(3, row_i)
-            # Delete from table2 to prevent overwriting
-            del j.table[j.table.index(row_j)]
-        else: # setting only exists in table1
-            comparison_handler(1, row_i)
+                compare_trees_util(row_i[0], Table(), comp)
+        else:
+            # First row in table2 with the same setting (if any)
+            row_j = None
+            if id(row_i[0]) not in comp.marked:
+                row_j = next((x for x in j.index.get(row_i[0].html, [])
+                              if id(x) not in comp.matched
+                              and id(x[0]) not in comp.marked), None)
+            if row_j: #if row in table2
+                # Ignore comment column if exists.
+                if row_i == row_j or (row_i[:-1] == row_j[:-1] and \
+                                      (i.table[0][0].name == 'th' and \
+                                       'Comment' in i.table[0][-1].strings)):
+                    record_comparison(0, row_i, comp, row_j=row_j)
+                else: #same setting different values
+                    record_comparison(3, row_i, comp, row_j=row_j)
+                # Remove from table2 to prevent overwriting
+                comp.matched.add(id(row_j))
+            else: # setting only exists in table1
+                record_comparison(1, row_i, comp, table_j=j)
     # Clean up remaining items in table j. Similar to previous loop
-    for row_j in j.table:
+    rows_j = [x for x in j.table if id(x) not in comp.matched]
+    for row_j in rows_j:
         if row_j and i.table:
             if row_j[0].name == 'th':
-                if row_j in i.table:
+                if id(row_j[0]) not in comp.marked and \
+                    row_j in [x for x in i.index.get(row_j[0].html, [])
+                              if id(x[0]) not in comp.marked]:
                     continue
                 else:
-                    for row in j.table[1:]:
-                        comparison_handler(2, row, i)
+                    for row in rows_j[1:]:
+                        record_comparison(2, row, comp, table_i=i)
                     return
             elif isinstance(row_j[0], Table):
-                compare_trees_util(Table(), row_j[0])
+                compare_trees_util(Table(), row_j[0], comp)
             else:
-                comparison_handler(2, row_j, i)
+                record_comparison(2, row_j, comp, table_i=i)
 
+def record_mirror(table, comp):
+    """Util function to record rows of a table in table2 that only exist in
+    table2 but can't be added to table1. They are only marked up when table2
+    is marked up against table1."""
+    for row in table.table:
+        if not row:
+            continue
+        elif row[0].name == 'th':
+            for row_th in table.table[1:]:
+                if row_th and not isinstance(row_th[0], Table):
+                    comp.changes.append(('row', 2, None, row_th, None, None))
+            return
+        elif isinstance(row[0], Table):
+            record_mirror(row[0], comp)
+        else:
+            comp.changes.append(('row', 2, None, row, None, None))
 
-def comparison_handler(comparison, row, table=None):
-    """Util function to change style of rows in input table/rows."""
-    if table and not table.html.name:
+def record_comparison(comparison, row, comp, table_i=None, table_j=None,
+                      row_j=None):
+    """Util function to record the comparison of a row for output.
+    row is in table1 unless comparison is 2 (exists only in 2). row_j is the
+    matching row in table2 and table_i/table_j the table the row would be
+    added to in the other report. Only the first comparison of a row is
+    kept, as is any style already set on the row in the original report."""
+    if table_i and table_i.pos is None:
         return
     if row and not isinstance(row, list):
         row = [row] # Prevents issues with NavigableString elements
     if not isinstance(row[0], Table) and row[0].name and \
-        not row[0].has_attr('style'):
-        if comparison == 0: # same in both
-            for data in row:
-                data['style'] = 'background:#82E0AA'
-        elif comparison == 1: # exists only in 1
-            for data in row:
-                data['style'] = 'background:#F1948A'
-        elif comparison == 2: # exists only in 2
-            # Need to add rows to table 1 for output
-            soup = BeautifulSoup('', 'lxml')
-            t_row = soup.new_tag('tr')
-            for data in row:
-                data['style'] = 'background:#BB8FCE'
-                t_row.append(data)
-            table.table.append(row)
-            table.html.append(t_row)
-        else: # exists but different
-            for data in row:
-                data['style'] = 'background:#F7DC6F'
-
-def update_html_general_section(soup, gpo1, gpo2):
-    """Update HTML General section with color key and remove other info."""
-    # pylint: disable=too-many-statements
+        not row[0].style and id(row[0]) not in comp.marked:
+        comp.marked.add(id(row[0]))
+        if comparison == 2:
+            comp.changes.append(('row', 2, None, row, table_i, None))
+        else:
+            comp.changes.append(('row', comparison, row, row_j, None,
+                                 table_j))
+
+def comparison_handler(comparison, row, table=None):
+    """Util function to change style of rows in input table/rows."""
+    if comparison == 0: # same in both
+        for data in row:
+            data['style'] = 'background:#82E0AA'
+    elif comparison == 1: # exists only in 1
+        for data in row:
+            data['style'] = 'background:#F1948A'
+    elif comparison == 2: # exists only in 2
+        # Need to add copies of rows to table 1 for output
+        soup = BeautifulSoup('', 'lxml')
+        t_row = soup.new_tag('tr')
+        for data in row:
+            data = copy.copy(data)
+            data['style'] = 'background:#BB8FCE'
+            t_row.append(data)
+        table.append(t_row)
+    else: # exists but different
+        for data in row:
+            data['style'] = 'background:#F7DC6F'
+
+def update_html_comparisons(soup, other, comp, side=0):
+    """Update HTML with the changes found by compare_trees.
+    soup is a copy of the soup of the report on side (0 for GPO 1, 1 for
+    GPO 2) of comp and other the soup of the other report. Tags are found in
+    them by position and tags from other are copied in. For side 1 the row
+    changes are reversed so the report is marked up as if it was GPO 1."""
+    nodes = soup.find_all(True)
+    other = other.find_all(True)
+    added = {}
+    for change in comp.changes:
+        if change[0] == 'row':
+            _, comparison, row1, row2, table1, table2 = change
+            if side:
+                comparison = {1: 2, 2: 1}.get(comparison, comparison)
+                row1, row2, table1, table2 = row2, row1, table2, table1
+            if comparison == 2:
+                row = [other[x.pos] for x
+                       in row2 if not isinstance(x, Table)]
+                # Rows with no table to add to only exist on the other side.
+                if table1 and table1.pos is not None and not row2[0].style:
+                    comparison_handler(comparison, row, nodes[table1.pos])
+            else:
+                row = [nodes[x.pos] for x in row1 if not isinstance(x, Table)]
+                # Only the first change to a row is kept.
+                if not row1[0].style and not row[0].has_attr('style'):
+                    comparison_handler(comparison, row)
+        elif change[1] != side:
+            continue
+        elif change[0] == 'style':
+            nodes[change[2]]['style'] = change[3]
+        else:
+            # Add section from other report. Adding a section again moves it.
+            _, _, container, div_to_add = change
+            if div_to_add not in added:
+                container_to_add = other[div_to_add].find_next_sibling(
+                    'div', class_='container')
+                added[div_to_add] = (
+                    copy.copy(other[div_to_add]),
+                    copy.copy(container_to_add) if container_to_add else None)
+            div_to_add, container_to_add = added[div_to_add]
+            div_to_add['style'] = 'background:#BB8FCE'
+            container = nodes[container]
+            container.append(div_to_add)
+            if container_to_add:
+                # Update all lower div styles since none are in tree
+                for j in container_to_add.find_all('span'):
+                    j.find_parent('div')['style'] = 'background:#BB8FCE'
+                container.append(container_to_add)
+
+def update_html_general_section(soup, gpo1, gpo2, headers=('GPO 1', 'GPO 2'),
+                                key=COLOR_KEY):
+    """Update HTML General section with color key and remove other info.
+    gpo1 and gpo2 are shown under headers and key is a list of (color,
+    meaning) of the colors used in the report."""
     summary = soup.find('div', class_='gposummary')
     summary = summary.next_element.find_next_sibling('div', class_='container')
     # Delete useless fields, leaving first table in details section.
@@ -337,21 +1250,17 @@ def update_html_general_section(soup, gpo1, gpo2):
     table = soup.new_tag('table', **class_attr)
     # Headers for GPO titles
     t_row = soup.new_tag('tr')
-    t_dat = soup.new_tag('th', scope='col')
-    t_dat.string = "GPO 1"
-    t_row.append(t_dat)
-    t_dat = soup.new_tag('th', scope='col')
-    t_dat.string = "GPO 2"
-    t_row.append(t_dat)
+    for text in headers:
+        t_dat = soup.new_tag('th', scope='col')
+        t_dat.string = text
+        t_row.append(t_dat)
     table.append(t_row)
     # Row for GPO titles
     t_row = soup.new_tag('tr')
-    t_dat = soup.new_tag('td')
-    t_dat.string = gpo1
-    t_row.append(t_dat)
-    t_dat = soup.new_tag('td')
-    t_dat.string = gpo2
-    t_row.append(t_dat)
+    for text in (gpo1, gpo2):
+        t_dat = soup.new_tag('td')
+        t_dat.string = text
+        t_row.append(t_dat)
     table.append(t_row)
 
     summary.append(table)
@@ -364,30 +1273,12 @@ def update_html_general_section(soup, gpo1, gpo2):
     t_row.append(t_dat)
     table.append(t_row)
     # Rows for colors
-    #ROW 1
-    t_row = soup.new_tag('tr')
-    t_dat = soup.new_tag('td', style='background:#F1948A')
-    t_dat.string = "Setting exists in GPO 1 but not in GPO 2."
-    t_row.append(t_dat)
-    table.append(t_row)
-    #ROW 2
-    t_row = soup.new_tag('tr')
-    t_dat = soup.new_tag('td', style='background:#BB8FCE')
-    t_dat.string = "Setting exists in GPO 2 but not in GPO 1."
-    t_row.append(t_dat)
-    table.append(t_row)
-    #ROW 3
-    t_row = soup.new_tag('tr')
-    t_dat = soup.new_tag('td', style='background:#F7DC6F')
-    t_dat.string = "Setting exists in both GPOs but has a different value."
-    t_row.append(t_dat)
-    table.append(t_row)
-    #ROW 4
-    t_row = soup.new_tag('tr')
-    t_dat = soup.new_tag('td', style='background:#82E0AA')
-    t_dat.string = "Setting is the same in both GPOs."
-    t_row.append(t_dat)
-    table.append(t_row)
+    for color, text in key:
+        t_row = soup.new_tag('tr')
+        t_dat = soup.new_tag('td', style='background:' + color)
+        t_dat.string = text
+        t_row.append(t_dat)
+        table.append(t_row)
 
     summary.append(table)
 
@@ -419,12 +1310,1225 @@ def update_html_delete_extra_util(root, path_list):
     for child in root.children:
         update_html_delete_extra_util(child, path_list)
 
+def output_name(path1, path2, output_format='html'):
+    """Returns the output file name for the comparison of two reports."""
+    return "{}_vs_{}.{}".format(
+        path1.name.split('.')[0], path2.name.split('.')[0],
+        output_format).replace(' ', '_')
+
+def pair_outputs(path1, path2, combined=False, output_format='html'):
+    """Returns the output file names written for a pair of reports. A JSON
+    diff holds both directions of the comparison and jsonl differences of
+    every pair go to the same file."""
+    if output_format == 'jsonl':
+        return [DIFFERENCES]
+    if output_format != 'html':
+        return [output_name(path1, path2, output_format)]
+    if combined:
+        return [output_name(path1, path2)]
+    return [output_name(path1, path2), output_name(path2, path1)]
+
+def compare_pair(report1, report2, sink, combined=False, compact=False,
+                 output_format='html'):
+    """Compare two loaded reports once and write both directions of the
+    comparison to sink, or only report1 against report2 if combined is set.
+    If output_format is json a diff is written instead, or its differences
+    as jsonl records if it is jsonl. Returns the number of files written."""
+    with measure('pairs', reports=[report1.path.name, report2.path.name]):
+        # Compare the two trees. Neither report is modified.
+        with timed('compare'):
+            comp = compare_trees(report1, report2)
+        if output_format == 'json':
+            with timed('write'):
+                write_diff(diff_pair(report1, report2, comp), sink,
+                           output_name(report1.path, report2.path, 'json'))
+            return 1
+        if output_format == 'jsonl':
+            with timed('write'):
+                sink.write(DIFFERENCES, diff_records(
+                    diff_pair(report1, report2, comp)))
+            return 1
+        write_report(report1, report2, comp, 0, sink,
+                     output_name(report1.path, report2.path), compact)
+        if combined:
+            return 1
+        write_report(report2, report1, comp, 1, sink,
+                     output_name(report2.path, report1.path), compact)
+        return 2
+
+def write_report(report1, report2, comp, side, sink, name, compact=False):
+    """Write report1 marked up with comp against report2 to output name of
+    sink. side is the side of comp that report1 is on (0 for GPO 1, 1 for
+    GPO 2). The output is indented like prettify() unless compact is set."""
+    # ===============
+    # HTML Generation
+    # ===============
+    try:
+        soup1, soup2 = report_soup(report1), report_soup(report2)
+        with timed('copy'):
+            soup1 = copy.copy(soup1)
+        with timed('markup'):
+            update_html_comparisons(soup1, soup2, comp, side)
+            update_html_general_section(soup1, report1.url, report2.url)
+        write_soup(soup1, sink, name, compact)
+    except IOError:
+        print('Output file error for {}.'.format(sink.path(name)))
+
+def write_soup(soup, sink, name, compact=False):
+    """Write marked up soup to output name of sink."""
+    with timed('write'):
+        if sink.shared_style:
+            for shared, text in share_head(soup):
+                sink.share(shared, text)
+        sink.write(name, serialize_soup(soup, not compact))
+
+def serialize_soup(soup, pretty=True, encoding='utf-8'):
+    """Yields the HTML of soup in pieces so it can be written as it is made
+    instead of as one string. Pieces are the same as those joined by
+    soup.prettify(encoding), or by soup.decode() if pretty is not set. This
+    follows Tag.decode of BeautifulSoup 4.15, the version it is tested
+    with. Without its internals (SERIALIZE_PIECES) the HTML is one piece."""
+    # pylint: disable=protected-access
+    if not SERIALIZE_PIECES:
+        yield soup.prettify() if pretty else soup.decode()
+        return
+    formatter = soup.formatter_for_name('minimal')
+    literal = None # Tag whose contents are written as they are (pre etc)
+    stack = []
+    elements = itertools.chain(soup.self_and_descendants, [None])
+    for element in elements:
+        # Close tags until reaching the parent of element.
+        while stack and (element is None or element.parent is not stack[-1]):
+            tag = stack.pop()
+            piece = tag._format_tag(encoding, formatter, False)
+            if tag is literal:
+                # Whitespace after this tag but none before it.
+                yield piece + '\n' if pretty and piece else piece
+                literal = None
+            else:
+                yield serialize_piece(tag, piece, formatter.indent * len(stack)
+                                      if pretty and not literal else None)
+        if element is None:
+            break
+        indent = formatter.indent * len(stack) \
+            if pretty and not literal else None
+        if not isinstance(element, Tag):
+            yield serialize_piece(element, element.output_ready(formatter),
+                                  indent)
+            continue
+        piece = element._format_tag(encoding, formatter, True)
+        if indent is not None and not element.is_empty_element and \
+                not element._should_pretty_print():
+            # Whitespace before this tag but none after it.
+            yield indent + piece if piece else piece
+            literal = element
+        else:
+            yield serialize_piece(element, piece, indent)
+        if not element.is_empty_element:
+            stack.append(element)
+
+def serialize_piece(element, piece, indent):
+    """Helper for serialize_soup that returns piece on its own line after
+    indent, or as it is if indent is None."""
+    if indent is None:
+        return piece
+    if isinstance(element, NavigableString):
+        piece = piece.strip()
+    return indent + piece + '\n' if piece else piece
+
+# ============
+# OUTPUT SINKS
+# ============
+# Outputs are written through a sink by name. Loose and gzip files are
+# written by whichever process compares the pair. An archive only has one
+# writer, the main process, so worker processes hold their outputs in a
+# SpoolSink and send them back with the progress of the pair. The same goes
+# for the jsonl stream, which the main process appends every pair to.
+
+class FileSink(object):
+    """Sink object class used to write outputs to the out folder as loose
+    files. If shared_style is set the style and scripts in the head of each
+    report are written once to shared files the reports link to."""
+    suffix = '' # Added to output names by sinks that compress files
+    resumable = True # Outputs of an interrupted run are kept
+
+    def __init__(self, out_f, shared_style=False):
+        self.out_f = out_f
+        self.shared_style = shared_style
+        self.shared = set() # Names of shared files written by this sink
+
+    def file(self, name):
+        """Returns the path of file name in the out folder."""
+        return self.out_f + "\\" + name
+
+    def path(self, name):
+        """Returns the path output name is written to."""
+        return self.file(name + self.suffix)
+
+    def open(self, name):
+        """Returns output name opened for writing text."""
+        return open(self.path(name), 'w', encoding='utf-8', newline='',
+                    errors='xmlcharrefreplace', buffering=OUTPUT_BUFFER)
+
+    def write(self, name, pieces):
+        """Write the text pieces to output name."""
+        with self.open(name) as file:
+            file.writelines(pieces)
+
+    def share(self, name, text):
+        """Write shared file name holding text unless it exists. Shared
+        files are never compressed so reports can link to them."""
+        if name in self.shared:
+            return
+        self.shared.add(name)
+        path = self.file(name)
+        if os.path.exists(path):
+            return
+        # Written under another name first as workers may share it at once.
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'w', encoding='utf-8', newline='') as file:
+            file.write(text)
+        os.replace(temp, path)
+
+    def exists(self, name):
+        """Returns True if output name has been written."""
+        return os.path.exists(self.path(name))
+
+    def remove(self, name):
+        """Delete output name if it exists."""
+        try:
+            os.remove(self.path(name))
+        except OSError:
+            pass
+
+    def start(self, keep):
+        """Start writing the outputs of a run. keep maps the (name1, name2)
+        pairs not compared again to their output names, which are kept as
+        is."""
+
+    def take(self):
+        """Returns the outputs held for the main process. Files are
+        written as they are made so none are held."""
+        return []
+
+    def close(self):
+        """Finish writing outputs."""
+
+class GzipSink(FileSink):
+    """Sink object class used to write outputs as gzip files."""
+    suffix = '.gz'
+
+    def open(self, name):
+        return gzip.open(self.path(name), 'wt', compresslevel=6,
+                         encoding='utf-8', newline='',
+                         errors='xmlcharrefreplace')
+
+class SpoolSink(FileSink):
+    """Sink object class used by worker processes to hold outputs and
+    shared files in memory until they are sent to the archive sink of the
+    main process."""
+    def __init__(self, out_f, shared_style=False):
+        super().__init__(out_f, shared_style)
+        self.outputs = [] # List of (name, bytes) not yet taken
+
+    def write(self, name, pieces):
+        self.outputs.append((name, ''.join(pieces).encode(
+            'utf-8', 'xmlcharrefreplace')))
+
+    def share(self, name, text):
+        if name not in self.shared:
+            self.shared.add(name)
+            self.outputs.append((name, text.encode('utf-8')))
+
+    def take(self):
+        outputs, self.outputs = self.outputs, []
+        return outputs
+
+class ArchiveSink(FileSink):
+    """Sink object class used to write outputs to one zip or tar.gz archive
+    in the out folder. The archive is written under a temporary name and
+    replaces the last one when closed, keeping the outputs of the last one
+    that the run keeps and didn't write again so incremental runs work the
+    same as with loose files. Nothing else is carried over. An interrupted
+    run never replaces the last archive so its journal can't be resumed
+    from."""
+    resumable = False
+
+    def __init__(self, out_f, output='zip', shared_style=False):
+        super().__init__(out_f, shared_style)
+        self.output = output
+        self.archive_path = self.file(ARCHIVES[output])
+        self.written = set() # Names added to the new archive
+        self.removed = set() # Names of the last archive not to keep
+        self.keep = set() # Names of the last archive to keep
+        try:
+            self.old = set(x for x, _ in read_archive(
+                self.archive_path, output, False))
+        except (IOError, EOFError, zipfile.BadZipFile, tarfile.TarError):
+            self.old = set()
+        if output == 'zip':
+            self.archive = zipfile.ZipFile(self.archive_path + '.tmp', 'w',
+                                           zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = tarfile.open(self.archive_path + '.tmp', 'w:gz')
+
+    def path(self, name):
+        return self.archive_path + ':' + name
+
+    def write(self, name, pieces):
+        self.add(name, ''.join(pieces).encode('utf-8', 'xmlcharrefreplace'))
+
+    def share(self, name, text):
+        self.add(name, text.encode('utf-8'))
+
+    def add(self, name, data):
+        """Add output name holding data to the archive once."""
+        if name in self.written:
+            return
+        self.written.add(name)
+        if self.output == 'zip':
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self.archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def exists(self, name):
+        return name in self.written or (name in self.old
+                                        and name not in self.removed)
+
+    def remove(self, name):
+        self.removed.add(name)
+
+    def start(self, keep):
+        self.keep = set(x for y in keep.values() for x in y)
+        # Kept reports may link to the shared files of the last archive.
+        if self.keep:
+            self.keep.update(x for x in self.old if re.fullmatch(
+                SHARED_FILE.format('[0-9a-f]+', '[a-z]+'), x))
+
+    def close(self):
+        """Copy the outputs kept from the last archive and replace it."""
+        kept = (self.old & self.keep) - self.removed - self.written
+        try:
+            if kept:
+                for name, data in read_archive(self.archive_path,
+                                               self.output):
+                    if name in kept:
+                        self.add(name, data)
+        except (IOError, EOFError, zipfile.BadZipFile, tarfile.TarError) as ex:
+            print('Archive error for {}: {}'.format(self.archive_path, ex))
+        try:
+            self.archive.close()
+            os.replace(self.archive_path + '.tmp', self.archive_path)
+        except IOError:
+            print('Output file error for {}.'.format(self.archive_path))
+
+class StreamSink(FileSink):
+    """Sink object class used to append the jsonl records of every pair to
+    one DIFFERENCES file, gzip compressed if compress is set. The records of
+    each pair are flushed once added so the journal never holds a pair that
+    isn't in the file. Records of the last file are kept for the pairs not
+    compared again so incremental and resumed runs work the same as with
+    loose files."""
+    def __init__(self, out_f, compress=False):
+        super().__init__(out_f)
+        self.suffix = '.gz' if compress else ''
+        self.stream = None
+
+    def start(self, keep):
+        path = self.path(DIFFERENCES)
+        old = path + '.old'
+        try:
+            os.replace(path, old)
+        except OSError:
+            old = None
+        self.stream = self.open_stream(path, 'wb')
+        if old is None:
+            return
+        try:
+            if keep:
+                with self.open_stream(old, 'rb') as file:
+                    for line in file:
+                        try:
+                            pair = tuple(json.loads(line)['pair'])
+                        except (ValueError, KeyError, TypeError):
+                            continue # Cut off by an interrupted run
+                        if pair in keep:
+                            self.stream.write(line)
+            os.remove(old)
+        except (IOError, EOFError) as ex:
+            print('Output file error for {}: {}'.format(old, ex))
+
+    def open_stream(self, path, mode):
+        """Returns the stream file at path opened in binary mode."""
+        if self.suffix:
+            return gzip.open(path, mode, compresslevel=6)
+        return open(path, mode, buffering=OUTPUT_BUFFER)
+
+    def write(self, name, pieces):
+        self.add(name, ''.join(pieces).encode('utf-8'))
+
+    def add(self, name, data):
+        """Append the records in data to the stream."""
+        if self.stream is None:
+            self.start(set())
+        self.stream.write(data)
+        self.stream.flush()
+
+    def remove(self, name):
+        # The records of changed pairs are dropped by start instead.
+        if name != DIFFERENCES:
+            super().remove(name)
+
+    def close(self):
+        """Close the stream."""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+class QueuedSink(object):
+    """Sink object class used to write outputs of sink through a Writer so
+    they are written while the next pair is compared. Outputs are made from
+    the soup they were marked up in by the writer thread."""
+    def __init__(self, sink, writer):
+        self.sink = sink
+        self.writer = writer
+        self.out_f = sink.out_f
+        self.shared_style = sink.shared_style
+
+    def path(self, name):
+        """Returns the path output name is written to."""
+        return self.sink.path(name)
+
+    def write(self, name, pieces):
+        """Write the text pieces to output name in the writer thread."""
+        self.writer.put(self.flush, self.sink.write, name, pieces)
+
+    def share(self, name, text):
+        """Write shared file name holding text in the writer thread."""
+        self.writer.put(self.flush, self.sink.share, name, text)
+
+    def flush(self, func, name, *args):
+        """Helper for the writer thread that writes output name."""
+        try:
+            with timed('flush'):
+                func(name, *args)
+        except IOError:
+            print('Output file error for {}.'.format(self.path(name)))
+
+    def exists(self, name):
+        """Returns True if output name has been written."""
+        return self.sink.exists(name)
+
+    def remove(self, name):
+        """Delete output name if it exists."""
+        self.sink.remove(name)
+
+    def take(self):
+        """Returns the outputs held for the main process."""
+        return self.sink.take()
+
+    def close(self):
+        """Finish writing outputs once the writer is closed."""
+        self.sink.close()
+
+def read_archive(path, output, contents=True):
+    """Yields the name of every file in the archive at path and its
+    contents if contents is set, else None."""
+    if output == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                yield name, archive.read(name) if contents else None
+    else:
+        with tarfile.open(path, 'r:gz') as archive:
+            for info in archive:
+                if info.isfile():
+                    yield info.name, archive.extractfile(
+                        info).read() if contents else None
+
+def open_sink(out_f, output='files', shared_style=False, spool=False,
+              writer=None, output_format='html'):
+    """Returns the sink outputs are written to in out_f. If spool is set
+    outputs of archive sinks and jsonl records are held for the main process
+    instead. Other outputs are written through writer if it is set. The
+    jsonl stream is a single file so it is only ever gzip compressed, never
+    archived."""
+    # pylint: disable=too-many-arguments
+    if output in ARCHIVES or output_format == 'jsonl':
+        if spool:
+            return SpoolSink(out_f, shared_style)
+        if output_format == 'jsonl':
+            sink = StreamSink(out_f, output == 'gzip')
+        else:
+            sink = ArchiveSink(out_f, output, shared_style)
+    elif output == 'gzip':
+        sink = GzipSink(out_f, shared_style)
+    else:
+        sink = FileSink(out_f, shared_style)
+    return QueuedSink(sink, writer) if writer else sink
+
+def share_head(soup):
+    """Move the style and scripts in the head of soup to shared files that
+    it links to instead. Returns the name and text of every shared file."""
+    shared = []
+    if soup.head is None:
+        return shared
+    for tag in soup.head.find_all(['style', 'script']):
+        text = ''.join(str(x) for x in tag.contents)
+        if not text.strip():
+            continue
+        if tag.name == 'style':
+            kind = 'css'
+        else:
+            kind = 'vbs' if tag.get('language', '').lower() == 'vbscript' \
+                else 'js'
+        name = SHARED_FILE.format(
+            hashlib.sha1(text.encode('utf-8')).hexdigest()[:12], kind)
+        if tag.name == 'style':
+            tag.replace_with(soup.new_tag('link', rel='stylesheet',
+                                          type='text/css', href=name))
+        else:
+            tag.clear()
+            tag['src'] = name
+        shared.append((name, text))
+    return shared
+
+# =========
+# JSON DIFF
+# =========
+# A diff holds every setting compared with its status and both values, and
+# the positions of the tags to mark up in either report. HTML reports are
+# only rendered from the diffs that are opened, without comparing again.
+
+def diff_pair(report1, report2, comp):
+    """Returns the diff of two reports compared in comp."""
+    paths = {}
+    for report in (report1, report2):
+        for path, row in report_rows(report):
+            paths[id(row[0])] = path
+    settings = []
+    for change in [x for x in comp.changes if x[0] == 'row']:
+        _, comparison, row1, row2, table1, table2 = change
+        row = row1 or row2
+        settings.append({
+            'status': DIFF_STATUS[comparison],
+            'path': paths.get(id(row[0])),
+            'setting': html_text(row[0].html),
+            'values': [row_value(x) if x else None for x in (row1, row2)],
+            'cells': [[y.pos for y in x if not isinstance(y, Table)]
+                      if x else None for x in (row1, row2)],
+            'styled': [bool(x and x[0].style) for x in (row1, row2)],
+            'tables': [x.pos if x else None for x in (table1, table2)]})
+    return {
+        'version': DIFF_VERSION,
+        'reports': [{'name': x.path.name, 'path': str(x.path.resolve()),
+                     'url': x.url, 'sha1': x.sha1}
+                    for x in (report1, report2)],
+        'settings': settings,
+        'sections': [{'status': status, 'path': ' / '.join(reversed(x.key))}
+                     for status, y, z in [('only1', report1, report2),
+                                          ('only2', report2, report1)]
+                     for x in y.leaf_list if x.key[:-1] not in z.sections],
+        'markup': [list(x) for x in comp.changes if x[0] != 'row']}
+
+def diff_records(diff):
+    """Yields a JSON line for every setting of a diff that isn't the same in
+    both reports and for every section only one report has."""
+    pair = [x['name'] for x in diff['reports']]
+    for setting in diff['settings']:
+        if setting['status'] != 'same':
+            yield json.dumps({'pair': pair, 'path': setting['path'],
+                              'key': setting['setting'],
+                              'status': setting['status'],
+                              'value1': setting['values'][0],
+                              'value2': setting['values'][1]}) + '\n'
+    for section in diff['sections']:
+        yield json.dumps({'pair': pair, 'path': section['path'], 'key': None,
+                          'status': section['status'], 'value1': None,
+                          'value2': None}) + '\n'
+
+def write_diff(diff, sink, name):
+    """Write a diff to output name of sink as compact JSON."""
+    try:
+        sink.write(name, json.JSONEncoder(
+            separators=(',', ':')).iterencode(diff))
+    except IOError:
+        print('Output file error for {}.'.format(sink.path(name)))
+
+def render_diff(diff_path, combined=False, compact=False):
+    """Write the HTML reports of a JSON diff to the folder it is in, or only
+    the first report against the second if combined is set. Both reports
+    must be unchanged since the diff was written. Returns the number of
+    files written."""
+    try:
+        with open(diff_path, 'r', encoding='utf-8') as file:
+            diff = json.load(file)
+    except (IOError, ValueError) as ex:
+        print('Diff file error for {}: {}'.format(diff_path, ex))
+        return 0
+    if diff.get('version') != DIFF_VERSION:
+        print('Diff file error for {}: wrong version.'.format(diff_path))
+        return 0
+    reports = []
+    for info in diff['reports']:
+        report = Report(Path(info['path']))
+        try:
+            sha1, text = read_report(report.path)
+        except (IOError, ValueError) as ex:
+            print('IOError: ' + str(ex))
+            return 0
+        if sha1 != info['sha1']:
+            print('Report {} changed since {} was written.'.format(
+                info['path'], diff_path))
+            return 0
+        report.sha1 = sha1
+        keep_soup(sha1, BeautifulSoup(text, 'lxml'))
+        report.url = info['url']
+        reports.append(report)
+    # Rebuild the changes of the comparison from positions in the diff.
+    comp = Comparison()
+    for setting in diff['settings']:
+        rows = [[Cell(pos=y, style=not n and z) for n, y in enumerate(x)]
+                if x is not None else None
+                for x, z in zip(setting['cells'], setting['styled'])]
+        tables = [Table(pos=x) if x is not None else None
+                  for x in setting['tables']]
+        comp.changes.append(('row', DIFF_STATUS.index(setting['status']),
+                             rows[0], rows[1], tables[0], tables[1]))
+    comp.changes += [tuple(x) for x in diff['markup']]
+    sink = FileSink(os.path.dirname(diff_path) or '.')
+    for side in (0,) if combined else (0, 1):
+        write_report(reports[side], reports[1 - side], comp, side, sink,
+                     output_name(reports[side].path, reports[1 - side].path),
+                     compact)
+    return 1 if combined else 2
+
+# ========
+# MANIFEST
+# ========
+# The manifest in the output folder holds the hash of every report and the
+# output files each report is part of. Incremental runs only compare pairs
+# with a report that changed since the manifest was written.
+
+def hash_reports(paths, old=None):
+    """Returns a map of file name to hash of contents of every report and a
+    map of file name to its [size, modification time]. Reports with the
+    same size and modification time as in old, the last manifest, keep
+    their hash from it so unchanged reports aren't read again."""
+    old = old or {}
+    hashes, stats = {}, {}
+    for path in paths:
+        try:
+            stat = path.stat()
+            stats[path.name] = [stat.st_size, stat.st_mtime_ns]
+            if old.get('stats', {}).get(path.name) == stats[path.name] \
+                    and path.name in old.get('reports', {}):
+                hashes[path.name] = old['reports'][path.name]
+            else:
+                hashes[path.name] = hashlib.sha1(
+                    path.read_bytes()).hexdigest()
+        except IOError as ex:
+            stats.pop(path.name, None)
+            print('IOError: ' + str(ex))
+    return hashes, stats
+
+def load_manifest(out_f):
+    """Load the manifest from the output folder. Returns None if there is
+    none or it is from another MANIFEST_VERSION."""
+    try:
+        with open(os.path.join(out_f, MANIFEST), 'r') as file:
+            manifest = json.load(file)
+    except (IOError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_manifest(out_f, manifest):
+    """Save the manifest to the output folder."""
+    path = os.path.join(out_f, MANIFEST)
+    try:
+        with open(path + '.tmp', 'w') as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+    except IOError:
+        print('Output file error for {}.'.format(path))
+
+def changed_pairs(sink, pairs, manifest, keep=()):
+    """Returns the pairs with a report that changed since the manifest in
+    the out folder of sink was written or with a missing output. Outputs of
+    changed and removed reports are deleted first so they are never left
+    stale, except for the outputs in keep which were written for the current
+    reports."""
+    old = load_manifest(sink.out_f) or {}
+    old_hashes = {}
+    if all(old.get(x) == manifest[x] for x in OUTPUT_OPTIONS):
+        old_hashes = old.get('reports', {})
+    changed = set(x for x, y in manifest['reports'].items()
+                  if old_hashes.get(x) != y)
+    # Pairs left out by the similarity filter stay left out if unchanged.
+    skipped = set()
+    if old.get('similarity') == manifest['similarity']:
+        skipped = set(tuple(x) for x in old.get('skipped', [])
+                      if not changed.intersection(x))
+    manifest['skipped'] = sorted(skipped)
+    for name, files in old.get('outputs', {}).items():
+        if name in changed or name not in manifest['reports']:
+            for file in [x for x in files if x not in keep]:
+                sink.remove(file)
+    return [(y, z) for y, z in pairs
+            if y.name in changed or z.name in changed
+            or (y.name, z.name) not in skipped
+            and not all(sink.exists(x) for x
+                        in pair_outputs(y, z, manifest['combined'],
+                                        manifest['format']))]
+
+# =======
+# JOURNAL
+# =======
+# Every pair compared is added to the journal in the output folder as soon
+# as its files are written. The journal is deleted when the run completes,
+# so if it exists the last run was interrupted and the pairs in it are not
+# compared again as long as their reports and the output options are the
+# same and their files still exist.
+
+def journal_options(manifest):
+    """Returns the options a journal is only valid for."""
+    return {x: manifest[x] for x in ('version',) + OUTPUT_OPTIONS}
+
+def journal_key(name1, name2, manifest):
+    """Returns the journal entry of a pair of reports."""
+    return (name1, manifest['reports'].get(name1),
+            name2, manifest['reports'].get(name2))
+
+def load_journal(out_f, manifest):
+    """Returns the journal entries of pairs finished by an interrupted run
+    into out_f with the same options."""
+    try:
+        with open(os.path.join(out_f, JOURNAL), 'r') as file:
+            lines = file.read().splitlines()
+        if json.loads(lines[0]) != journal_options(manifest):
+            return set()
+    except (IOError, ValueError, IndexError):
+        return set()
+    done = set()
+    for line in lines[1:]:
+        try:
+            done.add(tuple(json.loads(line)))
+        except ValueError:
+            continue # Last line may be cut off
+    return done
+
+def open_journal(out_f, manifest, done):
+    """Start a new journal in out_f holding the entries in done. Returns
+    the open journal or None if it can't be written."""
+    path = os.path.join(out_f, JOURNAL)
+    try:
+        journal = open(path, 'w')
+        journal.write(json.dumps(journal_options(manifest)) + '\n')
+        for entry in sorted(done):
+            journal.write(json.dumps(entry) + '\n')
+        journal.flush()
+    except IOError:
+        print('Output file error for {}.'.format(path))
+        return None
+    return journal
+
+def close_journal(out_f, journal):
+    """Close and delete the journal of a run that completed."""
+    if journal:
+        journal.close()
+        try:
+            os.remove(os.path.join(out_f, JOURNAL))
+        except OSError:
+            pass
+
+# =======
+# MINHASH
+# =======
+# Optional filter that only compares pairs of reports that share enough
+# settings. The similarity of two reports is estimated from MinHash
+# signatures of their leaf paths and settings and locality-sensitive
+# hashing (LSH) finds candidate pairs without comparing every signature.
+
+def report_features(report):
+    """Yields the path of every leaf of a report and the path and first cell
+    of every setting in it."""
+    for leaf in report.leaf_list:
+        path = '\x1f'.join(str(x) for x in leaf.key)
+        yield path
+        for table in leaf.table:
+            yield from table_features(table, path)
+
+def table_features(table, path):
+    """Yields the path and first cell of every setting in table."""
+    for row in table.table:
+        if not row:
+            continue
+        elif isinstance(row[0], Table):
+            yield from table_features(row[0], path)
+        elif row[0].name != 'th':
+            yield path + '\x1f' + row[0].html
+
+def minhash(report, count=MINHASH_PERMUTATIONS):
+    """Returns the MinHash signature of a report. The hash functions come
+    from a fixed seed so signatures are the same in every process."""
+    features = set(int.from_bytes(hashlib.sha1(
+        x.encode('utf-8')).digest()[:8], 'little') for x
+                   in report_features(report))
+    rand = random.Random(1)
+    signature = []
+    for _ in range(count):
+        a, b = rand.randrange(1, MINHASH_PRIME), rand.randrange(MINHASH_PRIME)
+        signature.append(min(((a * x + b) % MINHASH_PRIME for x in features),
+                             default=MINHASH_PRIME))
+    return signature
+
+def report_signature(path, cache_f=None, parser='bs4'):
+    """Worker function to load a report and return its MinHash signature or
+    None if it can't be loaded."""
+    report = load_report(path, cache_f, parser)
+    return minhash(report) if report else None
+
+def lsh_bands(threshold, count=MINHASH_PERMUTATIONS):
+    """Returns the number of bands and rows per band for LSH so pairs with a
+    similarity of about threshold or more become candidates. The threshold
+    of LSH is kept at or below threshold as candidates are checked after."""
+    options = [(x, count // x) for x in range(1, count + 1)
+               if (1 / x) ** (1 / (count // x)) <= threshold]
+    if not options:
+        return 1, count
+    return min(options, key=lambda x: threshold - (1 / x[0]) ** (1 / x[1]))
+
+def similar_pairs(pairs, signatures, threshold):
+    """Returns the pairs whose reports have an estimated similarity of at
+    least threshold. Pairs with a report without a signature are kept."""
+    bands, rows = lsh_bands(threshold)
+    buckets = {}
+    for path, signature in signatures.items():
+        if signature:
+            for band in range(bands):
+                bucket = (band, tuple(
+                    signature[band * rows:(band + 1) * rows]))
+                buckets.setdefault(bucket, []).append(path)
+    candidates = set()
+    for paths in buckets.values():
+        for idx, y in enumerate(paths):
+            for z in paths[idx + 1:]:
+                candidates.add((y, z))
+                candidates.add((z, y))
+    similar = []
+    for y, z in pairs:
+        if not signatures.get(y) or not signatures.get(z):
+            similar.append((y, z))
+        elif (y, z) in candidates and sum(
+                a == b for a, b in zip(signatures[y], signatures[z])) \
+                >= threshold * len(signatures[y]):
+            similar.append((y, z))
+    return similar
+
+# ==========
+# REDUNDANCY
+# ==========
+# Instead of comparing pairs, every report is read once and its settings are
+# added to an index of section path and setting to the values set for it and
+# the reports setting each value. Settings in more than one report are then
+# listed with the same or conflicting values.
+
+def html_text(html):
+    """Returns the text of an HTML string with whitespace collapsed."""
+    return ' '.join(unescape(re.sub('<[^>]*>', ' ', html or '')).split())
+
+def row_value(row):
+    """Returns the text of every cell of a row after the first."""
+    return ' | '.join(html_text(x.html) for x in row[1:]
+                      if not isinstance(x, Table))
+
+def report_rows(report):
+    """Yields (section path, row) of every setting in a report."""
+    for leaf in report.leaf_list:
+        path = ' / '.join(reversed(leaf.key))
+        for table in leaf.table:
+            yield from table_rows(table, path)
+
+def table_rows(table, path):
+    """Yields (section path, row) of every setting in table and its
+    subtables."""
+    name = html_text(table.name if table.paired_tag is None
+                     else table.paired_tag)
+    if name:
+        path += ' / ' + name
+    for row in table.table:
+        if not row:
+            continue
+        elif isinstance(row[0], Table):
+            yield from table_rows(row[0], path)
+        elif row[0].name != 'th':
+            yield path, row
+
+def report_settings(report):
+    """Returns a list of (section path, setting, value) of every setting in a
+    report. The value is the text of every cell after the first."""
+    return [(path, html_text(row[0].html), row_value(row))
+            for path, row in report_rows(report)]
+
+def load_settings(path, cache_f=None, parser='bs4'):
+    """Worker function to load a report and return its settings or None if
+    it can't be loaded."""
+    report = load_report(path, cache_f, parser)
+    return report_settings(report) if report else None
+
+def index_settings(index, name, settings):
+    """Add the settings of report name to the index of (section path,
+    setting) to a map of value to the reports setting that value."""
+    for path, key, value in settings:
+        names = index.setdefault((path, key), {}).setdefault(value, [])
+        if name not in names:
+            names.append(name)
+
+def redundant_settings(index):
+    """Returns rows of (section path, setting, value, status, reports) of
+    every setting set in more than one report. Status is Same if every report
+    sets the same value and Conflict otherwise."""
+    rows = []
+    for (path, key), values in sorted(index.items()):
+        # A report setting the same key twice isn't redundant on its own.
+        if len(set().union(*values.values())) < 2:
+            continue
+        status = 'Same' if len(values) == 1 else 'Conflict'
+        for value, names in sorted(values.items()):
+            rows.append((path, key, value, status, names))
+    return rows
+
+def write_redundancy(out_f, rows):
+    """Write the redundant settings to a CSV file in the output folder."""
+    path = os.path.join(out_f, REDUNDANCY)
+    try:
+        with open(path, 'w', newline='', encoding='utf-8-sig') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Section', 'Setting', 'Value', 'Status',
+                             'Count', 'GPOs'])
+            for section, key, value, status, names in rows:
+                writer.writerow([section, key, value, status, len(names),
+                                 '; '.join(names)])
+    except IOError:
+        print('Output file error for {}.'.format(path))
+
+# =========
+# AGGREGATE
+# =========
+# Instead of one report per pair, every report is written once marked up
+# against all the others. Each pair is still compared once, for both of its
+# reports, and the rows of each report collect the names of the reports
+# setting them to the same or a different value. Every report is then
+# marked up once with the names added to its rows.
+
+def aggregate_name(path):
+    """Returns the output file name of the aggregate report of a report."""
+    return "{}_vs_all.html".format(path.name.split('.')[0]).replace(' ', '_')
+
+def aggregate_pair(report1, report2):
+    """Compare two reports and return (rows, divs) for each of them, or None
+    if either failed to load or they can't be compared. rows holds the cell
+    positions of every compared row with its comparison (0 same, 1 only in
+    that report, 3 different) and divs the positions of the section divs
+    missing from the other report."""
+    if not report1 or not report2:
+        return None
+    try:
+        with timed('compare'):
+            comp = compare_trees(report1, report2)
+    except Exception as ex: # pylint: disable=broad-except
+        print('Compare error for {} and {}: {!r}'.format(
+            report1.path.name, report2.path.name, ex))
+        return None
+    sides = (([], set()), ([], set()))
+    for change in comp.changes:
+        if change[0] == 'row':
+            _, comparison, row1, row2 = change[:4]
+            for side, row in ((0, row1), (1, row2)):
+                if row:
+                    sides[side][0].append((tuple(
+                        x.pos for x in row if not isinstance(x, Table)),
+                                           1 if comparison == 2
+                                           else comparison))
+        elif change[0] == 'style' and change[2] is not None:
+            sides[change[1]][1].add(change[2])
+    return tuple((x, sorted(y)) for x, y in sides)
+
+def aggregate_block(pairs, cache_f=None, parser='bs4'):
+    """Worker function to compare every pair of reports in a block for
+    aggregate reports. Each report is loaded once for the block and the
+    result of aggregate_pair for every pair is reported through the PROGRESS
+    queue with the names of its reports."""
+    reports = {}
+    reads = read_ahead(list(dict.fromkeys(x for y in pairs for x in y)))
+    for y, z in pairs:
+        for path in (y, z):
+            if path not in reports:
+                reports[path] = load_report(path, cache_f, parser,
+                                            next(reads)[1])
+        PROGRESS.put((y.name, z.name,
+                      aggregate_pair(reports[y], reports[z])))
+
+def aggregate_report(path, aggregate, out_f, cache_f=None, parser='bs4',
+                     compact=False, output='files', shared_style=False):
+    """Worker function to load a report and write its aggregate report.
+    Returns the outputs for the main process to archive."""
+    # pylint: disable=too-many-arguments
+    sink = open_sink(out_f, output, shared_style, spool=True)
+    report = load_report(path, cache_f, parser)
+    if report:
+        write_aggregate(report, aggregate, sink, compact)
+    return sink.take()
+
+def write_aggregate(report, aggregate, sink, compact=False):
+    """Write the aggregate report of report to sink. Its soup is marked up
+    directly, once, and dropped afterwards."""
+    name = aggregate_name(report.path)
+    try:
+        soup = report_soup(report, keep=False)
+        with timed('markup'):
+            nodes = soup.find_all(True)
+            # Sections missing from every other report
+            for div, count in aggregate.divs.items():
+                if count == aggregate.count:
+                    nodes[div]['style'] = 'background:#F1948A'
+            for cells, same, changed in aggregate.rows.values():
+                row = [nodes[x] for x in cells]
+                color = AGGREGATE_KEY[1 if changed else 2 if same else 0][0]
+                for data in row:
+                    data['style'] = 'background:' + color
+                # Reports with the setting are listed in its last cell.
+                for label, names in (('Same in', same),
+                                     ('Different in', changed)):
+                    if names:
+                        t_div = soup.new_tag('div')
+                        t_div.string = '{}: {}'.format(label, ', '.join(
+                            x.split('.')[0] for x in sorted(names)))
+                        row[-1].append(t_div)
+            update_html_general_section(
+                soup, report.url, '{} reports'.format(aggregate.count),
+                ('GPO', 'Compared with'), AGGREGATE_KEY)
+        write_soup(soup, sink, name, compact)
+    except IOError:
+        print('Output file error for {}.'.format(sink.path(name)))
+
+# =========
+# PROFILING
+# =========
+# With profiling on, the time of every phase is added up and every report
+# and pair gets a record of its time per phase and the size of its tree.
+# These are written to PROFILE in the out folder, slowest first, and the
+# slowest pairs are compared again under cProfile.
+
+def write_metrics(out_f, metrics, seconds):
+    """Write metrics of a run that took seconds to the output folder."""
+    path = os.path.join(out_f, PROFILE)
+    try:
+        with open(path, 'w') as file:
+            json.dump({
+                'seconds': seconds,
+                'phases': {x: {'calls': y[0], 'seconds': y[1]}
+                           for x, y in metrics.phases.items()},
+                'reports': sorted(metrics.reports,
+                                  key=lambda x: -x['seconds']),
+                'pairs': sorted(metrics.pairs, key=lambda x: -x['seconds'])},
+                      file, indent=1)
+    except IOError:
+        print('Output file error for {}.'.format(path))
+
+def profile_pairs(out_f, metrics, paths, count, combined=False,
+                  compact=False, output_format='html', cache_f=None,
+                  parser='bs4', sink=None):
+    """Compare the count slowest pairs in metrics again under cProfile and
+    dump the stats of each to the output folder for pstats or snakeviz.
+    Outputs are written to sink again, or to loose files if it is None."""
+    sink = sink or FileSink(out_f)
+    paths = {x.name: x for x in paths}
+    for record in sorted(metrics.pairs, key=lambda x: -x['seconds'])[:count]:
+        path1, path2 = [paths[x] for x in record['reports']]
+        report1 = load_report(path1, cache_f, parser)
+        report2 = load_report(path2, cache_f, parser)
+        if not report1 or not report2:
+            continue
+        profiler = cProfile.Profile()
+        profiler.runcall(compare_pair, report1, report2, sink, combined,
+                         compact, output_format)
+        profiler.dump_stats(os.path.join(
+            out_f, 'profile_' + output_name(path1, path2, 'prof')))
+
+# ========
+# PIPELINE
+# ========
+# Each process comparing reports reads them ahead in a reader thread and
+# writes outputs in a writer thread, so reading, comparing and writing
+# overlap when the bin or out folder is slow, such as a network share. Both
+# threads are a bounded number of items ahead or behind the compares so
+# memory stays bounded.
+
+def read_ahead(paths, size=READ_AHEAD):
+    """Yields each of paths with its contents from read_report, read in a
+    thread of its own at most size reports ahead, or with None if it can't
+    be read."""
+    items = queue.Queue(size)
+
+    def read():
+        for path in paths:
+            try:
+                with timed('read'):
+                    contents = read_report(path)
+            except (IOError, ValueError):
+                contents = None # Read again by load_report for its error
+            items.put((path, contents))
+
+    threading.Thread(target=read, daemon=True).start()
+    for _ in paths:
+        yield items.get()
+
+class Writer(object):
+    """Writer object class used to run the writes of outputs, and what has
+    to wait for them, in order in a thread of its own. When size tasks are
+    waiting, put waits for the writer to catch up."""
+    def __init__(self, size=WRITE_AHEAD):
+        self.tasks = queue.Queue(size)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, func, *args):
+        """Run func with args after every task put before it."""
+        self.tasks.put((func, args))
+
+    def run(self):
+        """Run tasks until closed."""
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            func, args = task
+            try:
+                func(*args)
+            except Exception as ex: # pylint: disable=broad-except
+                print('Writer error: {!r}'.format(ex))
+
+    def close(self):
+        """Wait for every task to finish."""
+        self.tasks.put(None)
+        self.thread.join()
+
+# =======
+# WORKERS
+# =======
+
+def init_worker(progress=None, profile=False, log=None):
+    """Initialize worker process with the progress queue used to report
+    finished pairs and record metrics if profile is set. Errors are appended
+    to log if it is set, as worker processes don't share the stdout of the
+    main process."""
+    global PROGRESS, METRICS
+    PROGRESS = progress
+    METRICS = Metrics() if profile else None
+    if log:
+        try:
+            # Line buffered so lines of every process stay whole.
+            sys.stdout = open(log, 'a', buffering=1)
+        except IOError as ex:
+            print('Log file error for {}: {}'.format(log, ex))
+
+def compare_block(pairs, out_f, combined=False, cache_f=None, parser='bs4',
+                  compact=False, output_format='html', output='files',
+                  shared_style=False):
+    """Worker function to compare every pair of reports in a block. Each
+    report is loaded once for the block and the files written for every
+    finished pair are reported through the PROGRESS queue with the names of
+    its reports, along with the outputs for the main process to archive.
+    Returns the metrics of the block when profiling."""
+    # pylint: disable=too-many-arguments
+    reports = {}
+    writer = Writer()
+    sink = open_sink(out_f, output, shared_style, spool=True, writer=writer,
+                     output_format=output_format)
+    # Reports are read ahead in the order they are first needed.
+    reads = read_ahead(list(dict.fromkeys(x for y in pairs for x in y)))
+    for y, z in pairs:
+        for path in (y, z):
+            if path not in reports:
+                reports[path] = load_report(path, cache_f, parser,
+                                            next(reads)[1])
+        # Progress is only reported once the files of the pair are written.
+        writer.put(PROGRESS.put, (y.name, z.name) + run_pair(
+            y, z, reports[y], reports[z], sink, combined, compact,
+            output_format) + (sink.take(),))
+    writer.close()
+    return take_metrics()
+
+def run_pair(path1, path2, report1, report2, sink, combined=False,
+             compact=False, output_format='html'):
+    """Compare the reports of a pair of paths, either of which is None if it
+    failed to load. Errors comparing them are printed so the rest of the
+    batch still runs. Returns the number of files done and whether they were
+    written."""
+    # pylint: disable=too-many-arguments
+    if report1 and report2:
+        try:
+            return compare_pair(report1, report2, sink, combined, compact,
+                                output_format), True
+        except Exception as ex: # pylint: disable=broad-except
+            print('Compare error for {} and {}: {!r}'.format(
+                path1.name, path2.name, ex))
+    return len(pair_outputs(path1, path2, combined, output_format)), False
+
+def take_metrics():
+    """Returns the metrics recorded so far in this process and starts
+    recording new ones, or None when not profiling."""
+    global METRICS
+    metrics = METRICS
+    if metrics is not None:
+        METRICS = Metrics()
+    return metrics
+
+def make_blocks(paths, pairs, workers):
+    """Split pairs of paths into blocks for worker processes. Blocks are
+    small enough that each worker gets several of them and each block only
+    holds a limited number of reports in memory at once. Blocks have at
+    least 8 reports a side as every block loads its own reports. Only blocks
+    on or above the diagonal are used as pairs are unordered and blocks
+    without any of pairs are left out."""
+    size = max(1, min(BLOCK_SIZE, max(8, math.ceil(
+        len(paths) / (2 * math.sqrt(workers))))))
+    chunks = [paths[x:x + size] for x in range(0, len(paths), size)]
+    pairs = set(pairs)
+    blocks = []
+    for idx, rows in enumerate(chunks):
+        for cols in chunks[idx:]:
+            blocks.append([(y, z) for n, y in enumerate(rows)
+                           for z in (cols[n + 1:] if rows is cols else cols)
+                           if (y, z) in pairs])
+    return [x for x in blocks if x]
+
 class main_app():
     """Main application class that initializes program for comparisons."""
-    def __init__(self, bin_f, out_f, pbar, ppercent):
-        iterator = 0
+    # pylint: disable=too-many-locals
+    def __init__(self, bin_f, out_f, pbar=None, ppercent=None, workers=1,
+                 combined=False, cache_f=None, parser='bs4',
+                 incremental=False, similarity=0, redundancy=False,
+                 compact=False, output_format='html', profile=None,
+                 output='files', shared_style=False, aggregate=False):
+        global METRICS
+        self.pbar = pbar
+        self.ppercent = ppercent
+        self.iterator = 0
+        self.total = 0
+        self.journal = None
+        self.manifest = None
+        self.sink = None
+        self.writer = None
         input_files = []
-        url1, url2 = None, None
+        reports = {}
 
         # ================
         # Input Validation
@@ -433,98 +2537,384 @@ class main_app():
             raise OSError('Filepath {} does not exist.'.format(bin_f))
         elif not Path(out_f).exists():
             raise OSError('Filepath {} does not exist.'.format(out_f))
+        elif parser not in PARSERS:
+            raise ValueError('Parser {} is not one of {}.'.format(
+                parser, ', '.join(PARSERS)))
+        elif output_format not in FORMATS:
+            raise ValueError('Format {} is not one of {}.'.format(
+                output_format, ', '.join(FORMATS)))
+        elif output not in OUTPUTS:
+            raise ValueError('Output {} is not one of {}.'.format(
+                output, ', '.join(OUTPUTS)))
+        elif not 0 <= similarity <= 1:
+            raise ValueError('Similarity {} is not between 0 and 1.'.format(
+                similarity))
+        else:
+            # Get all files in bin folder, sorted so the first report of a
+            # pair doesn't depend on the order the folder is listed in.
+            input_files = sorted(p for p in Path(bin_f).iterdir()
+                                 if p.is_file() and
+                                 str(p).split('.')[-1] == 'html')
+        if redundancy:
+            self.find_redundancy(input_files, out_f, workers, cache_f, parser)
+            return
+        if aggregate:
+            self.write_aggregates(input_files, out_f, workers, cache_f,
+                                  parser, compact, output, shared_style)
+            return
+        # Metrics are recorded for every report and pair when profiling.
+        METRICS = Metrics() if profile is not None else None
+        start = time.perf_counter()
+        # Each pair of reports is compared once and written in both
+        # directions unless a combined report is wanted.
+        pairs = [(y, z) for idx, y in enumerate(input_files)
+                 for z in input_files[idx + 1:]]
+        hashes, stats = hash_reports(input_files, load_manifest(out_f))
+        manifest = {'version': MANIFEST_VERSION, 'combined': combined,
+                    'compact': compact, 'format': output_format,
+                    'output': output, 'shared_style': shared_style,
+                    'similarity': similarity, 'skipped': [],
+                    'reports': hashes, 'stats': stats, 'outputs': {}}
+        for y, z in pairs:
+            for path in (y, z):
+                manifest['outputs'].setdefault(path.name, []).extend(
+                    pair_outputs(y, z, combined, output_format))
+        if output_format == 'jsonl':
+            manifest['outputs'] = {x: list(dict.fromkeys(y))
+                                   for x, y in manifest['outputs'].items()}
+        self.manifest = manifest
+        self.sink = open_sink(out_f, output, shared_style,
+                              output_format=output_format)
+        every_pair = pairs
+        # Pairs finished by an interrupted run are not compared again.
+        done = load_journal(out_f, manifest) if self.sink.resumable else set()
+        done = [(y, z) for y, z in pairs
+                if journal_key(y.name, z.name, manifest) in done]
+        if incremental:
+            pairs = changed_pairs(self.sink, pairs, manifest, set(
+                x for y, z in done
+                for x in pair_outputs(y, z, combined, output_format)))
+        done = set((y, z) for y, z in done if all(
+            self.sink.exists(x)
+            for x in pair_outputs(y, z, combined, output_format)))
+        if done:
+            self.update_status('Resuming: {} pairs done'.format(len(done)))
+        pairs = [x for x in pairs if x not in done]
+        self.journal = open_journal(out_f, manifest, set(
+            journal_key(y.name, z.name, manifest) for y, z in done))
+        compared = set(pairs)
+        self.sink.start({(y.name, z.name): pair_outputs(y, z, combined,
+                                                       output_format)
+                         for y, z in every_pair if (y, z) not in compared})
+        # Finished pairs are journaled by the writer once they are written.
+        self.writer = Writer()
+        needed = set(x for y in pairs for x in y)
+        needed = [x for x in input_files if x in needed]
+
+        if workers > 1:
+            # =================
+            # Parallel Compares
+            # =================
+            # Blocks of pairs are compared in worker processes which report
+            # back through the queue after every pair. The queue is bounded
+            # so workers wait on the writer here when it falls behind.
+            progress = multiprocessing.Queue(WRITE_AHEAD * workers)
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=init_worker,
+                                     initargs=(progress, METRICS is not None,
+                                               LOG)) as executor:
+                if similarity:
+                    self.update_status('Signatures: {}'.format(len(needed)))
+                    pairs = self.filter_pairs(pairs, dict(zip(
+                        needed, executor.map(
+                            report_signature, needed,
+                            itertools.repeat(cache_f),
+                            itertools.repeat(parser),
+                            chunksize=max(1, len(needed) // (workers * 4))))),
+                                              similarity, manifest)
+                self.init_progress(sum(len(pair_outputs(
+                    y, z, combined, output_format)) for y, z in pairs))
+                futures = [executor.submit(compare_block, x, out_f, combined,
+                                           cache_f, parser, compact,
+                                           output_format, output,
+                                           shared_style)
+                           for x in make_blocks(input_files, pairs, workers)]
+                received = 0
+                while received < len(pairs):
+                    try:
+                        result = progress.get(timeout=0.5)
+                    except queue.Empty:
+                        if all(x.done() for x in futures) and progress.empty():
+                            break
+                        continue
+                    received += 1
+                    self.writer.put(self.finish_pair, *result)
+                for future in futures:
+                    if future.exception():
+                        print('Worker error: ' + str(future.exception()))
+                    elif METRICS is not None and future.result():
+                        METRICS.merge(future.result())
         else:
-            # Get all files in bin folder and create all
-            # combinations for comparison.
-            input_files = [p for p in Path(bin_f).iterdir() if p.is_file() and
-                           str(p).split('.')[-1] == 'html']
-            input_files = [x for x
-                           in [("file:" + str(y),
-                                "file:" + str(z),
-                                out_f + "\\" + "{}_vs_{}.html".format(
-                                    y.name.split('.')[0],
-                                    z.name.split('.')[0]).replace(
-                                        ' ', '_')) for y
-                               in input_files for z
-                               in input_files if y != z]]
-        # Initialize progress bar.
-        pbar['maximum'] = len(input_files)
-        pbar.update_idletasks()
-        for url1, url2, html_outfile in [x for x in input_files]:
-            # Lists used to store all leaf nodes.
-            # Makes life easier in comparison.
-            leaf_list1 = []
-            leaf_list2 = []
             # ==================
             # BS4 Initialization
             # ==================
-            try: #Test first html file
-                response1 = urlopen(url1).read()
-                soup1 = BeautifulSoup(response1, 'lxml')
-            except urllib.error.HTTPError as ex:
-                print('HTTPError: ' + str(ex.code))
-            except urllib.error.URLError as ex:
-                print('URLError: ' + str(ex.reason))
-            except IOError as ex:
-                print('IOError: ' + str(ex))
-
-            try: # Test second html file
-                response2 = urlopen(url2).read()
-                soup2 = BeautifulSoup(response2, 'lxml')
-            except urllib.error.HTTPError as ex:
-                print('HTTPError: ' + str(ex.code))
-            except urllib.error.URLError as ex:
-                print('URLError: ' + str(ex.reason))
-            except IOError as ex:
-                print('IOError: ' + str(ex))
+            # Every report is read, parsed and built into a tree once and
+            # then reused for all comparisons it is a part of.
+            for path, contents in read_ahead(needed):
+                reports[path] = load_report(path, cache_f, parser, contents)
+                self.update_status('Loading: {}/{}'.format(
+                    len(reports), len(needed)))
+            if similarity:
+                pairs = self.filter_pairs(pairs, {
+                    x: minhash(y) if y else None for x, y in reports.items()},
+                                          similarity, manifest)
+            self.init_progress(sum(len(pair_outputs(
+                y, z, combined, output_format)) for y, z in pairs))
+            # Pairs are written while the next one is compared.
+            sink = QueuedSink(self.sink, self.writer)
+            for y, z in pairs:
+                self.writer.put(self.finish_pair, y.name, z.name, *run_pair(
+                    y, z, reports[y], reports[z], sink, combined, compact,
+                    output_format))
+        self.writer.close()
+        self.sink.close()
+        save_manifest(out_f, manifest)
+        close_journal(out_f, self.journal)
+        if METRICS is not None:
+            metrics, METRICS = METRICS, None
+            write_metrics(out_f, metrics, time.perf_counter() - start)
+            # The archive is closed so pairs are only written to memory.
+            profile_pairs(out_f, metrics, input_files, profile, combined,
+                          compact, output_format, cache_f, parser, open_sink(
+                              out_f, output, shared_style, spool=True,
+                              output_format=output_format))
+        if cache_f:
+            evict_cache(cache_f)
+
+    def find_redundancy(self, input_files, out_f, workers=1, cache_f=None,
+                        parser='bs4'):
+        """Read every report once and write the settings set in more than one
+        of them instead of comparing pairs of reports."""
+        index = {}
+        self.init_progress(len(input_files))
+        with contextlib.ExitStack() as stack:
+            if workers > 1:
+                executor = stack.enter_context(
+                    ProcessPoolExecutor(max_workers=workers,
+                                        initializer=init_worker,
+                                        initargs=(None, False, LOG)))
+                results = executor.map(
+                    load_settings, input_files, itertools.repeat(cache_f),
+                    itertools.repeat(parser),
+                    chunksize=max(1, len(input_files) // (workers * 4)))
+            else:
+                results = (load_settings(x, cache_f, parser)
+                           for x in input_files)
+            for path, settings in zip(input_files, results):
+                if settings:
+                    index_settings(index, path.name, settings)
+                self.update_progress(1)
+        write_redundancy(out_f, redundant_settings(index))
+        if cache_f:
+            evict_cache(cache_f)
 
-            body1 = soup1.find('body')
-            body2 = soup2.find('body')
+    def write_aggregates(self, input_files, out_f, workers=1, cache_f=None,
+                         parser='bs4', compact=False, output='files',
+                         shared_style=False):
+        """Compare every pair of reports once and write one aggregate report
+        per report instead of one report per pair."""
+        # pylint: disable=too-many-arguments
+        sink = open_sink(out_f, output, shared_style)
+        aggregates = {x.name: Aggregate() for x in input_files}
+        pairs = [(y, z) for idx, y in enumerate(input_files)
+                 for z in input_files[idx + 1:]]
+        self.init_progress(len(pairs) + len(input_files))
+        if workers > 1:
+            progress = multiprocessing.Queue(WRITE_AHEAD * workers)
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=init_worker,
+                                     initargs=(progress, False, LOG)
+                                    ) as executor:
+                futures = [executor.submit(aggregate_block, x, cache_f,
+                                           parser)
+                           for x in make_blocks(input_files, pairs, workers)]
+                done = 0
+                while done < len(pairs):
+                    try:
+                        name1, name2, sides = progress.get(timeout=0.5)
+                    except queue.Empty:
+                        if all(x.done() for x in futures) and progress.empty():
+                            break
+                        continue
+                    if sides:
+                        aggregates[name1].add(name2, *sides[0])
+                        aggregates[name2].add(name1, *sides[1])
+                    done += 1
+                    self.update_progress(1)
+                for future in futures:
+                    if future.exception():
+                        print('Worker error: ' + str(future.exception()))
+                # Reports are marked up in the worker processes too.
+                for outputs in executor.map(
+                        aggregate_report, input_files,
+                        [aggregates[x.name] for x in input_files],
+                        itertools.repeat(out_f), itertools.repeat(cache_f),
+                        itertools.repeat(parser), itertools.repeat(compact),
+                        itertools.repeat(output),
+                        itertools.repeat(shared_style)):
+                    for name, data in outputs:
+                        sink.add(name, data)
+                    self.update_progress(1)
+        else:
+            reports = {}
+            for path, contents in read_ahead(input_files):
+                reports[path] = load_report(path, cache_f, parser, contents)
+            for y, z in pairs:
+                sides = aggregate_pair(reports[y], reports[z])
+                if sides:
+                    aggregates[y.name].add(z.name, *sides[0])
+                    aggregates[z.name].add(y.name, *sides[1])
+                self.update_progress(1)
+            # Reports are written while the next one is marked up.
+            writer = Writer()
+            for path in input_files:
+                if reports[path]:
+                    write_aggregate(reports[path], aggregates[path.name],
+                                    QueuedSink(sink, writer), compact)
+                reports[path] = None
+                writer.put(self.update_progress, 1)
+            writer.close()
+        sink.close()
+        if cache_f:
+            evict_cache(cache_f)
+
+    @staticmethod
+    def filter_pairs(pairs, signatures, similarity, manifest):
+        """Returns the pairs with a similarity of at least similarity. Other
+        pairs are added to the skipped pairs of the manifest."""
+        similar = similar_pairs(pairs, signatures, similarity)
+        manifest['skipped'] += sorted(
+            (y.name, z.name) for y, z in set(pairs) - set(similar))
+        return similar
+
+    def init_progress(self, total):
+        """Initialize progress bar for total files."""
+        self.total = total
+        if self.pbar is not None:
+            self.pbar['maximum'] = self.total
+            self.pbar.update_idletasks()
 
-            # ===============
-            # Tree Generation
-            # ===============
-            root = Tree()
-            root.name = url1 + ' v ' + url2
-            tree1, leaf_list1 = build_tree(body1, root, leaf_list1)
+    def finish_pair(self, name1, name2, count, written, outputs=()):
+        """Add the outputs of a finished pair from a worker process to the
+        archive or jsonl stream, and the pair to the progress bar and to the
+        journal if its files were written. Run by the writer thread."""
+        if outputs:
+            with timed('flush'):
+                for name, data in outputs:
+                    self.sink.add(name, data)
+        self.update_progress(count)
+        if written and self.journal:
+            self.journal.write(json.dumps(journal_key(
+                name1, name2, self.manifest)) + '\n')
+            self.journal.flush()
 
-            root = Tree()
-            root.name = url2 + ' v ' + url1
-            tree2, leaf_list2 = build_tree(body2, root, leaf_list2)
+    def update_progress(self, count):
+        """Add count finished pairs to the progress bar and label."""
+        # ===================
+        # PROGRESS BAR UPDATE
+        # ===================
+        self.iterator += count
+        if self.pbar is not None:
+            self.pbar['value'] = self.iterator
+            self.pbar.update_idletasks()
+        self.update_status('File: {}/{}'.format(self.iterator, self.total))
+
+    def update_status(self, text):
+        """Show text in the progress label or print it without a GUI."""
+        if self.ppercent is not None:
+            self.ppercent['text'] = text
+        else:
+            print(text, flush=True)
 
-            # Compare the two trees and update their node contents.
-            compare_trees(leaf_list1, leaf_list2, body1)
+def cli_app(argv=None):
+    """Parses command line arguments and compares files without the GUI.
+    Progress and errors are printed to stdout or appended to a log file by
+    every process."""
+    global LOG
+    parser = argparse.ArgumentParser(
+        description='Compare every pair of GPO html report files in a folder.')
+    parser.add_argument('bin_folder', nargs='?',
+                        help='Path to bin folder containing html reports.')
+    parser.add_argument('html_output', nargs='?',
+                        help='Folder in which to save output reports.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of processes used to compare reports.')
+    parser.add_argument('--combined', action='store_true',
+                        help='Write one report per pair of GPOs.')
+    parser.add_argument('--compact', action='store_true',
+                        help='Write reports without indentation.')
+    parser.add_argument('--format', choices=FORMATS, default=FORMATS[0],
+                        help='Write marked up html reports, json diffs or '
+                        'one jsonl file of every difference.')
+    parser.add_argument('--output', choices=OUTPUTS, default=OUTPUTS[0],
+                        help='Write loose files, gzip files or one zip or '
+                        'tar.gz archive.')
+    parser.add_argument('--shared-style', action='store_true',
+                        help='Move the style and scripts of reports to '
+                        'shared files.')
+    parser.add_argument('--render', nargs='+', default=None, metavar='DIFF',
+                        help='Write the html reports of json diffs instead '
+                        'of comparing a bin folder.')
+    parser.add_argument('--cache', default=None,
+                        help='Folder in which to cache parsed reports.')
+    parser.add_argument('--parser', choices=PARSERS, default=PARSERS[0],
+                        help='Parser used to read reports.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only compare reports changed since last run.')
+    parser.add_argument('--similarity', type=float, default=0,
+                        help='Only compare pairs of reports with at least '
+                        'this estimated share of settings (0 to 1).')
+    parser.add_argument('--redundancy', action='store_true',
+                        help='Only list settings set in more than one report '
+                        'in {}.'.format(REDUNDANCY))
+    parser.add_argument('--aggregate', action='store_true',
+                        help='Write one report per GPO marked up against '
+                        'every other GPO instead of one per pair.')
+    parser.add_argument('--profile', type=int, nargs='?', const=0,
+                        default=None, metavar='N',
+                        help='Write time per phase, report and pair to {} '
+                        'and cProfile stats of the N slowest pairs.'.format(
+                            PROFILE))
+    parser.add_argument('--log', default=None,
+                        help='File to append progress and errors to.')
+    args = parser.parse_args(argv)
+    if not args.render and not (args.bin_folder and args.html_output):
+        parser.error('bin_folder and html_output are required.')
 
-            # ===============
-            # HTML Generation
-            # ===============
+    with contextlib.ExitStack() as stack:
+        if args.log:
             try:
-                update_html_general_section(soup1, url1, url2)
-                html_out = soup1.prettify('utf-8')
-                with open(html_outfile, 'wb') as file:
-                    file.write(html_out)
-            except IOError:
-                print('Output file error for {}.'.format(html_outfile))
-
-            # =============
-            # Clean Up Data
-            # =============
-            # This prevents slowdown over time from variables not being GC'd
-            del soup1, soup2
-            del response1, response2
-            del body1, body2
-            del root
-            del tree1, tree2
-            del leaf_list1[:], leaf_list1, leaf_list2[:], leaf_list2
-            del html_out
-
-            # ===================
-            # PROGRESS BAR UPDATE
-            # ===================
-            iterator += 1
-            pbar['value'] = iterator
-            pbar.update_idletasks()
-            ppercent['text'] = 'File: {}/{}'.format(iterator, len(input_files))
+                log = stack.enter_context(open(args.log, 'a', buffering=1))
+            except IOError as ex:
+                parser.error(str(ex))
+            stack.enter_context(contextlib.redirect_stdout(log))
+            LOG = args.log
+        if args.render:
+            for path in args.render:
+                render_diff(path, args.combined, args.compact)
+            return
+        try:
+            main_app(args.bin_folder, args.html_output,
+                     workers=max(args.workers, 1), combined=args.combined,
+                     cache_f=args.cache, parser=args.parser,
+                     incremental=args.incremental,
+                     similarity=args.similarity,
+                     redundancy=args.redundancy, compact=args.compact,
+                     output_format=args.format, profile=args.profile,
+                     output=args.output, shared_style=args.shared_style,
+                     aggregate=args.aggregate)
+        except (OSError, ValueError) as ex:
+            parser.error(str(ex))
 
 class gui_app:
     """Class to handle GUI init and functionality"""
@@ -547,6 +2937,22 @@ class gui_app:
         dirname = askdirectory(initialdir=os.getcwd(), title='Select Folder')
         out_var.set(dirname)
 
+    def get_cache(self):
+        """Gets directory from user input for the parse cache."""
+        Tk().withdraw()
+        dirname = askdirectory(initialdir=os.getcwd(), title='Select Folder')
+        self.cache_var.set(dirname)
+
+    def get_diff(self):
+        """Gets JSON diffs from user input and renders their reports."""
+        Tk().withdraw()
+        for path in askopenfilename(initialdir=self.out_text.get() or
+                                    os.getcwd(), title='Select Diffs',
+                                    multiple=True,
+                                    filetypes=[('JSON diff', '*.json')]):
+            render_diff(path, bool(self.combined_var.get()),
+                        bool(self.compact_var.get()))
+
     def build_frame(self, status, name):
         """Builds tkinter frame."""
         self.root.wm_title('GPO Report Compare Tool')
@@ -586,6 +2992,126 @@ class gui_app:
         self.out_text = Entry(self.frame, textvariable=self.out_var)
         self.out_text.grid(row=1, column=1, columnspan=7, sticky='WE', pady=2)
 
+        # Optional folder for parsed reports. Left empty nothing is cached.
+        self.cache_label = Label(self.frame, text='Cache Folder:')
+        self.cache_label.grid(row=2, column=0, sticky='E', padx=5, pady=2)
+
+        self.cache_button = Button(self.frame, text='Browse ...',
+                                   command=self.get_cache)
+        self.cache_button.grid(row=2, column=8, sticky='W', padx=5, pady=2)
+
+        self.cache_var = StringVar(self.root)
+
+        self.cache_text = Entry(self.frame, textvariable=self.cache_var)
+        self.cache_text.grid(row=2, column=1, columnspan=7, sticky='WE',
+                             pady=2)
+
+        self.workers_label = Label(self.frame, text='Workers:')
+        self.workers_label.grid(row=3, column=0, sticky='E', padx=5, pady=2)
+
+        # Number of processes used for comparisons. 1 runs them in order.
+        self.workers_var = StringVar(self.root)
+        self.workers_var.set(str(os.cpu_count() or 1))
+
+        self.workers_text = Spinbox(self.frame, from_=1,
+                                    to=max(os.cpu_count() or 1, 1) * 4,
+                                    width=5, textvariable=self.workers_var)
+        self.workers_text.grid(row=3, column=1, sticky='W', pady=2)
+
+        # Only write one report per pair instead of one for each direction.
+        self.combined_var = IntVar(self.root)
+        self.combined_check = Checkbutton(self.frame, text='Combined report',
+                                          variable=self.combined_var)
+        self.combined_check.grid(row=3, column=2, columnspan=6, sticky='W',
+                                 pady=2)
+
+        # Parser used to build trees from reports.
+        self.parser_label = Label(self.frame, text='Parser:')
+        self.parser_label.grid(row=4, column=0, sticky='E', padx=5, pady=2)
+
+        self.parser_var = StringVar(self.root)
+        self.parser_var.set(PARSERS[0])
+
+        self.parser_box = ttk.Combobox(self.frame, values=PARSERS, width=5,
+                                       state='readonly',
+                                       textvariable=self.parser_var)
+        self.parser_box.grid(row=4, column=1, sticky='W', pady=2)
+
+        # Only compare reports that changed since the last run.
+        self.incremental_var = IntVar(self.root)
+        self.incremental_check = Checkbutton(
+            self.frame, text='Only changed reports',
+            variable=self.incremental_var)
+        self.incremental_check.grid(row=4, column=2, columnspan=6,
+                                    sticky='W', pady=2)
+
+        # Only compare pairs sharing at least this share of settings.
+        self.similarity_label = Label(self.frame, text='Min Similarity:')
+        self.similarity_label.grid(row=5, column=0, sticky='E', padx=5,
+                                   pady=2)
+
+        self.similarity_var = StringVar(self.root)
+        self.similarity_var.set('0')
+
+        self.similarity_text = Spinbox(self.frame, from_=0, to=1,
+                                       increment=0.05, width=5,
+                                       textvariable=self.similarity_var)
+        self.similarity_text.grid(row=5, column=1, sticky='W', pady=2)
+
+        # List settings set in more than one report instead of comparing.
+        self.redundancy_var = IntVar(self.root)
+        self.redundancy_check = Checkbutton(
+            self.frame, text='Redundant settings only',
+            variable=self.redundancy_var)
+        self.redundancy_check.grid(row=5, column=2, columnspan=6,
+                                   sticky='W', pady=2)
+
+        # Write reports without indentation.
+        self.compact_var = IntVar(self.root)
+        self.compact_check = Checkbutton(self.frame, text='Compact output',
+                                         variable=self.compact_var)
+        self.compact_check.grid(row=6, column=2, columnspan=6, sticky='W',
+                                pady=2)
+
+        # Write marked up reports or JSON diffs to render later.
+        self.format_label = Label(self.frame, text='Format:')
+        self.format_label.grid(row=6, column=0, sticky='E', padx=5, pady=2)
+
+        self.format_var = StringVar(self.root)
+        self.format_var.set(FORMATS[0])
+
+        self.format_box = ttk.Combobox(self.frame, values=FORMATS, width=5,
+                                       state='readonly',
+                                       textvariable=self.format_var)
+        self.format_box.grid(row=6, column=1, sticky='W', pady=2)
+
+        # Write loose files, gzip files or one archive.
+        self.output_label = Label(self.frame, text='Output:')
+        self.output_label.grid(row=7, column=0, sticky='E', padx=5, pady=2)
+
+        self.output_var = StringVar(self.root)
+        self.output_var.set(OUTPUTS[0])
+
+        self.output_box = ttk.Combobox(self.frame, values=OUTPUTS, width=5,
+                                       state='readonly',
+                                       textvariable=self.output_var)
+        self.output_box.grid(row=7, column=1, sticky='W', pady=2)
+
+        # Link reports to one shared copy of their style and scripts.
+        self.shared_var = IntVar(self.root)
+        self.shared_check = Checkbutton(self.frame, text='Shared style',
+                                        variable=self.shared_var)
+        self.shared_check.grid(row=7, column=2, columnspan=6, sticky='W',
+                               pady=2)
+
+        # Write one report per GPO against all others instead of per pair.
+        self.aggregate_var = IntVar(self.root)
+        self.aggregate_check = Checkbutton(self.frame,
+                                           text='One report per GPO',
+                                           variable=self.aggregate_var)
+        self.aggregate_check.grid(row=8, column=2, columnspan=6, sticky='W',
+                                  pady=2)
+
         # ============
         # SUBMIT FRAME
         # ============
@@ -597,6 +3123,10 @@ class gui_app:
                                     command=(lambda: self.start_status(None)))
         self.submit_button.grid(row=0, column=0, sticky='W', padx=5, pady=5)
 
+        self.render_button = Button(self.submit_frame, text='Render Diffs',
+                                    command=self.get_diff)
+        self.render_button.grid(row=1, column=0, sticky='W', padx=5, pady=5)
+
         self.progress = ttk.Progressbar(self.submit_frame,
                                         orient=HORIZONTAL, mode='determinate')
         self.progress.grid(row=0, column=1, columnspan=7)
@@ -635,9 +3165,26 @@ class gui_app:
     def start_app(self):
         """Calls main class to compare files."""
         main_app(self.in_text.get(), self.out_text.get(),
-                 self.progress, self.progress_percent)
+                 self.progress, self.progress_percent,
+                 int(self.workers_text.get()),
+                 bool(self.combined_var.get()),
+                 self.cache_text.get() or None,
+                 self.parser_var.get(),
+                 bool(self.incremental_var.get()),
+                 float(self.similarity_text.get()),
+                 bool(self.redundancy_var.get()),
+                 bool(self.compact_var.get()),
+                 self.format_var.get(),
+                 output=self.output_var.get(),
+                 shared_style=bool(self.shared_var.get()),
+                 aggregate=bool(self.aggregate_var.get()))
 
 if __name__ == '__main__':
+    # Required for worker processes in a frozen (PyInstaller) executable.
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        cli_app()
+        sys.exit(0)
     ROOT = Tk()
     GUI = gui_app(ROOT, 100)
     in_dir, out_dir, in_var, out_var = GUI.build_frame('', 'Directory')
@@ -0,0 +1,8 @@
+"""Tests of compare_reports.py on synthetic GPMC reports from
+benchmarks.generate.
+
+Example:
+    Run from the Compare_GPOs folder.
+
+        C:\\Compare_GPOs> python -m unittest discover tests
+"""
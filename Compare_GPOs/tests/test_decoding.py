@@ -0,0 +1,89 @@
+""" Decoding Tests
+
+GPMC saves reports as UTF-16, but reports saved again by other tools may
+be UTF-8, with or without a BOM, or Windows-1252. Every encoding must build
+the same tree whether the report is read or mapped into memory, and files
+that aren't reports must be left out when loaded.
+"""
+
+__author__ = "Bryan Greener"
+__license__ = "See readme in repo root for license info."
+
+import io
+import sys
+import codecs
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from pathlib import Path
+
+from benchmarks.generate import generate
+from tests import test_equivalence
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+import compare_reports # pylint: disable=wrong-import-position
+
+# Name, BOM and encoding of every way a report may be saved.
+ENCODINGS = (('utf-8', b'', 'utf-8'),
+             ('utf-8-bom', codecs.BOM_UTF8, 'utf-8'),
+             ('utf-16-le', b'', 'utf-16-le'),
+             ('utf-16-le-bom', codecs.BOM_UTF16_LE, 'utf-16-le'),
+             ('utf-16-be', b'', 'utf-16-be'),
+             ('utf-16-be-bom', codecs.BOM_UTF16_BE, 'utf-16-be'),
+             ('cp1252', b'', 'cp1252'))
+
+class DecodingTest(unittest.TestCase):
+    """Checks reports saved in every encoding load the same."""
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.TemporaryDirectory()
+        path = Path(generate(cls.temp.name, 1, seed=2, sections=2,
+                             encoding='utf-8')[0])
+        # Settings outside ASCII tell UTF-8 and Windows-1252 apart.
+        cls.text = path.read_text(encoding='utf-8').replace(
+            'Setting', 'Réglage')
+        cls.path = path
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp.cleanup()
+
+    def load(self, data, mmap_size):
+        """Returns the report holding data loaded with MMAP_SIZE patched to
+        mmap_size, and what it printed."""
+        self.path.write_bytes(data)
+        output = io.StringIO()
+        with mock.patch.object(compare_reports, 'MMAP_SIZE', mmap_size), \
+                redirect_stdout(output):
+            report = compare_reports.load_report(self.path)
+        return report, output.getvalue()
+
+    def test_encodings_build_same_tree(self):
+        """Every encoding builds the same tree, read or mapped."""
+        model = test_equivalence.model
+        expected, _ = self.load(self.text.encode('utf-8'), 1 << 30)
+        self.assertTrue(expected.leaf_list)
+        for name, bom, encoding in ENCODINGS:
+            for mmap_size in (0, 1 << 30):
+                with self.subTest(encoding=name, mmap_size=mmap_size):
+                    report, _ = self.load(
+                        bom + self.text.encode(encoding), mmap_size)
+                    self.assertEqual(model(report.root), model(expected.root))
+                    self.assertEqual(model(report.leaf_list),
+                                     model(expected.leaf_list))
+
+    def test_rejects_files_that_arent_reports(self):
+        """Empty and junk files are left out instead of loaded."""
+        junk = (b'', b'\x00\xff\x12junk\x80',
+                '<html><body><p>Not a report</p></body></html>'.encode(
+                    'utf-16'))
+        for data in junk:
+            for mmap_size in (0, 1 << 30):
+                with self.subTest(data=data[:8], mmap_size=mmap_size):
+                    report, output = self.load(data, mmap_size)
+                    self.assertIsNone(report)
+                    self.assertTrue(output)
+
+if __name__ == '__main__':
+    unittest.main()
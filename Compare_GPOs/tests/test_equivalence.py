@@ -0,0 +1,89 @@
+""" Equivalence Tests
+
+The lxml parser must build the same tree as the bs4 parser, and
+serialize_soup must write the same HTML as prettify() and decode(), or
+outputs would change with the parser or with how they are written. Both
+are checked on a small generated corpus.
+"""
+
+__author__ = "Bryan Greener"
+__license__ = "See readme in repo root for license info."
+
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+from benchmarks.generate import generate
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+import compare_reports # pylint: disable=wrong-import-position
+
+def model(obj):
+    """Returns the tree, table or cell obj and everything in it as nested
+    tuples that compare equal when the trees are the same."""
+    if isinstance(obj, (compare_reports.Tree, compare_reports.Table,
+                        compare_reports.Cell)):
+        # The parent is left out as it leads back up the tree and data is
+        # only set while building. Digests hash the HTML of leaves as each
+        # parser writes it and are only compared between trees of the same
+        # parser.
+        return (type(obj).__name__,) + tuple(
+            (x, model(getattr(obj, x, None))) for x in obj.__slots__
+            if x not in ('parent', 'data', 'digest'))
+    if isinstance(obj, (list, tuple)):
+        return tuple(model(x) for x in obj)
+    if isinstance(obj, dict):
+        return tuple(sorted((x, model(y)) for x, y in obj.items()))
+    return obj
+
+class EquivalenceTest(unittest.TestCase):
+    """Checks parsers and serialization against each other on generated
+    reports."""
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.TemporaryDirectory()
+        cls.paths = [Path(x) for x in generate(cls.temp.name, 3, seed=1,
+                                                  sections=2)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp.cleanup()
+
+    def test_parsers_build_same_tree(self):
+        """bs4 and lxml build equal trees and leaves."""
+        for path in self.paths:
+            with self.subTest(report=path.name):
+                bs4_report = compare_reports.load_report(path, parser='bs4')
+                lxml_report = compare_reports.load_report(path,
+                                                          parser='lxml')
+                self.assertTrue(bs4_report.leaf_list)
+                self.assertEqual(model(bs4_report.root),
+                                 model(lxml_report.root))
+                self.assertEqual(model(bs4_report.leaf_list),
+                                 model(lxml_report.leaf_list))
+
+    def test_serialize_soup_matches_bs4(self):
+        """serialize_soup joins to prettify() and decode()."""
+        for path in self.paths:
+            with self.subTest(report=path.name):
+                report = compare_reports.load_report(path)
+                soup = compare_reports.report_soup(report)
+                self.assertEqual(''.join(compare_reports.serialize_soup(
+                    soup)), soup.prettify())
+                self.assertEqual(''.join(compare_reports.serialize_soup(
+                    soup, False)), soup.decode())
+
+    def test_serialize_soup_fallback(self):
+        """serialize_soup writes the same without the bs4 internals."""
+        soup = compare_reports.report_soup(
+            compare_reports.load_report(self.paths[0]))
+        with mock.patch.object(compare_reports, 'SERIALIZE_PIECES', False):
+            self.assertEqual(''.join(compare_reports.serialize_soup(soup)),
+                             soup.prettify())
+            self.assertEqual(''.join(compare_reports.serialize_soup(
+                soup, False)), soup.decode())
+
+if __name__ == '__main__':
+    unittest.main()
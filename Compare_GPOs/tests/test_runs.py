@@ -0,0 +1,113 @@
+""" Run Tests
+
+Runs main_app on a small generated corpus. A run that resumes the journal
+of an interrupted run, or that only compares changed reports, must write
+the same outputs as a full run.
+"""
+
+__author__ = "Bryan Greener"
+__license__ = "See readme in repo root for license info."
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from pathlib import Path
+
+from benchmarks.generate import generate
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+import compare_reports # pylint: disable=wrong-import-position
+
+def outputs(out_f):
+    """Returns a map of file name to contents of every output in out_f."""
+    return {x.name: x.read_bytes() for x in Path(out_f).iterdir()
+            if not x.name.endswith((compare_reports.MANIFEST,
+                                    compare_reports.JOURNAL))}
+
+class RunTest(unittest.TestCase):
+    """Checks runs of main_app against a full run."""
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.bin_f = os.path.join(self.temp.name, 'bin')
+        generate(self.bin_f, 4, seed=3, sections=2, rows=4)
+        self.cwd = os.getcwd()
+        self.writers = [] # Writers of the runs, closed if interrupted
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp.cleanup()
+
+    def run_app(self, name, stop=None, **kwargs):
+        """Run main_app into out folder name, interrupting it when the pair
+        after stop is compared if stop is set. Outputs are written to the
+        out folder by its path joined with a backslash, so the run is made
+        from inside it. Returns the out folder and the pairs compared."""
+        out_f = os.path.join(self.temp.name, name)
+        os.makedirs(out_f, exist_ok=True)
+        compare_pair = compare_reports.compare_pair
+        compared = []
+        writers = self.writers
+
+        def compare(report1, report2, *args):
+            if stop is not None and len(compared) == stop:
+                raise KeyboardInterrupt
+            compared.append((report1.path.name, report2.path.name))
+            return compare_pair(report1, report2, *args)
+
+        class Writer(compare_reports.Writer):
+            # pylint: disable=missing-docstring
+            def __init__(self, *args):
+                super().__init__(*args)
+                writers.append(self)
+
+        os.chdir(out_f)
+        with mock.patch.object(compare_reports, 'compare_pair', compare), \
+                mock.patch.object(compare_reports, 'Writer', Writer), \
+                redirect_stdout(io.StringIO()):
+            try:
+                compare_reports.main_app(self.bin_f, '.', **kwargs)
+            except KeyboardInterrupt:
+                # Pairs already compared are still written and journaled.
+                writers[-1].close()
+            finally:
+                os.chdir(self.cwd)
+        return out_f, compared
+
+    def test_resume_truncated_journal(self):
+        """A journal cut off mid-line resumes from its complete lines."""
+        full_f, compared = self.run_app('full')
+        self.assertEqual(len(compared), 6)
+        out_f, _ = self.run_app('out', stop=3)
+        journal = next(Path(out_f).glob('*' + compare_reports.JOURNAL))
+        lines = journal.read_text().splitlines()
+        self.assertEqual(len(lines), 4)
+        # The options line and two pairs are left whole.
+        journal.write_text('\n'.join(lines[:-1]) + '\n' + lines[-1][:10])
+        _, compared = self.run_app('out')
+        self.assertEqual(len(compared), 4)
+        self.assertEqual(outputs(out_f), outputs(full_f))
+        self.assertFalse(list(Path(out_f).glob(
+            '*' + compare_reports.JOURNAL)))
+
+    def test_incremental_run(self):
+        """Only pairs of edited reports are compared again and outputs of
+        removed reports are deleted."""
+        out_f, _ = self.run_app('out', incremental=True)
+        edited = Path(self.bin_f, 'GPO 0.html')
+        edited.write_text(edited.read_text(encoding='utf-16').replace(
+            'Setting', 'Settings', 1), encoding='utf-16')
+        os.remove(os.path.join(self.bin_f, 'GPO 3.html'))
+        _, compared = self.run_app('out', incremental=True)
+        self.assertEqual(sorted(compared), [('GPO 0.html', 'GPO 1.html'),
+                                            ('GPO 0.html', 'GPO 2.html')])
+        full_f, _ = self.run_app('full')
+        self.assertEqual(outputs(out_f), outputs(full_f))
+        _, compared = self.run_app('out', incremental=True)
+        self.assertEqual(compared, [])
+
+if __name__ == '__main__':
+    unittest.main()